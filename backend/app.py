@@ -11,19 +11,26 @@ from routes.user_routes import user_bp
 from routes.camera_routes import camera_bp
 from routes.detection_routes import detection_bp
 from routes.model_routes import model_bp
+from routes.system_routes import system_bp
+from routes.socket_events import register_socket_handlers
 from services.db_service import setup_database
 from services.camera_service import start_camera_threads
+from services.message_queue import socketio_options
+from services.retention_service import retention_job
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*", "expose_headers": ["X-Next-Cursor", "Content-Disposition"]}})
 
 # Configure JWT
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')  # Change this in production!
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 jwt = JWTManager(app)
 
-# Configure Socket.IO
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Configure Socket.IO (with SOCKETIO_MESSAGE_QUEUE set, emits reach clients on every server process)
+socketio = SocketIO(app, **socketio_options())
+
+# Authenticated connections join their user room (and the admin room)
+register_socket_handlers(socketio)
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -31,11 +38,15 @@ app.register_blueprint(user_bp, url_prefix='/api/users')
 app.register_blueprint(camera_bp, url_prefix='/api/cameras')
 app.register_blueprint(detection_bp, url_prefix='/api/detections')
 app.register_blueprint(model_bp, url_prefix='/api/models')
+app.register_blueprint(system_bp, url_prefix='/api/system')
 
 if __name__ == '__main__':
     # Setup database
     setup_database()
     
+    # Keep detection partitions ahead of time and archive the expired ones
+    retention_job.start()
+    
     # Start background threads for active cameras
     start_camera_threads(socketio)
     
@@ -0,0 +1,234 @@
+"""Detection export memory benchmark.
+
+Builds a multi-million-row detections table in SQLite (standing in for MySQL) and
+exports it in each format through services.export_service, the chunked encoders
+behind /api/detections/export. It reports throughput, output size and peak memory
+growth per run, each run in a fresh process. --naive adds the old approach for
+comparison: fetchall() and one JSON list. --cancel-after N adds a run per format
+that stops reading after N rows, like a cancelled download, and reports how long
+releasing the connection took.
+
+--mysql reads the configured MySQL database (DB_* settings) instead, through the
+app's connection pool and an unbuffered cursor like the endpoint, so cancelled runs
+go through the same discard path. Parquet needs pyarrow. Peak memory comes from
+getrusage, so Linux or macOS only.
+
+    cd backend
+    python benchmarks/export_memory.py --rows 2000000 --formats csv,ndjson,parquet --gzip --naive --cancel-after 100000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.export_service import EXPORT_COLUMNS, export_chunks, iter_chunks, parquet_available
+from services.stream_service import ClosingStream
+
+DETECTION_TYPES = ['person', 'crowd', 'fire', 'smoke', 'weapon', 'vehicle']
+BATCH_SIZE = 50000
+
+def export_query():
+    columns = ', '.join('c.name AS camera_name' if column == 'camera_name' else f"d.{column}" for column in EXPORT_COLUMNS)
+    return f"""
+    SELECT {columns}
+    FROM detections d
+    JOIN cameras c ON d.camera_id = c.id
+    ORDER BY d.timestamp, d.id
+    """
+
+def build_sqlite(path, rows, cameras=50):
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        existing = conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+        conn.close()
+        if existing == rows:
+            print(f"Reusing {path} ({rows} rows)")
+            return
+        os.remove(path)
+
+    print(f"Building {path} with {rows} rows...")
+    started = time.monotonic()
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE cameras (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+    CREATE TABLE detections (
+        id INTEGER PRIMARY KEY,
+        camera_id INT NOT NULL,
+        user_id INT NOT NULL,
+        model_id INT NOT NULL,
+        detection_type TEXT NOT NULL,
+        confidence_score REAL NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        metadata TEXT,
+        ended_at TIMESTAMP,
+        hit_count INT NOT NULL DEFAULT 1,
+        video_clip_path TEXT
+    );
+    """)
+    conn.executemany("INSERT INTO cameras (id, name) VALUES (?, ?)",
+                     [(index, f"Camera {index}") for index in range(1, cameras + 1)])
+
+    # About six months of detections, in insert order like the real table
+    rng = random.Random(42)
+    start = datetime(2026, 1, 1)
+    step = timedelta(days=180) / rows
+    for offset in range(0, rows, BATCH_SIZE):
+        batch = []
+        for index in range(offset, min(rows, offset + BATCH_SIZE)):
+            timestamp = start + step * index
+            hits = rng.choice([1, 1, 1, 2, 5, 20])
+            box = [rng.randint(0, 1200), rng.randint(0, 600), rng.randint(20, 200), rng.randint(20, 200)]
+            batch.append((
+                index + 1,
+                rng.randint(1, cameras),
+                rng.randint(1, 10),
+                rng.randint(1, 4),
+                rng.choice(DETECTION_TYPES),
+                round(rng.uniform(0.5, 1.0), 4),
+                timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                json.dumps({'detections': [{'bounding_box': box, 'confidence': 0.9}]}),
+                (timestamp + timedelta(seconds=hits)).strftime('%Y-%m-%d %H:%M:%S') if hits > 1 else None,
+                hits,
+                None
+            ))
+        conn.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("CREATE INDEX idx_detections_time ON detections (timestamp, id)")
+    conn.commit()
+    conn.close()
+    print(f"Built in {time.monotonic() - started:.1f}s ({os.path.getsize(path) / 1e6:.0f} MB)")
+
+class SqliteConnection:
+    """Gives a SQLite connection the pooled connection's discard(); SQLite has no unread rows to drain."""
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def cursor(self, **kwargs):
+        return self.connection.cursor()
+
+    def close(self):
+        self.connection.close()
+
+    def discard(self):
+        self.connection.close()
+
+def open_cursor(source, path, buffered):
+    if source == 'mysql':
+        from config import DB_CONFIG
+        from services.db_service import ConnectionPool
+        conn = ConnectionPool(DB_CONFIG, 1, 10, 5).get_connection()
+    else:
+        conn = SqliteConnection(path)
+    cursor = conn.cursor(buffered=buffered)
+    cursor.execute(export_query())
+    return conn, cursor
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_export(source, path, fmt, compress, cancel_after, chunk_size, results):
+    naive = fmt == 'naive-json'
+    conn, cursor = open_cursor(source, path, buffered=naive)
+    baseline = peak_rss_mb()
+    started = time.monotonic()
+
+    rows = 0
+    size = 0
+    if naive:
+        # Everything in memory at once, as the unpaginated listing used to do
+        data = cursor.fetchall()
+        rows = len(data)
+        body = json.dumps([dict(zip(EXPORT_COLUMNS, row)) for row in data], default=str).encode()
+        size = len(body)
+        cursor.close()
+        conn.close()
+        elapsed = time.monotonic() - started
+        close_seconds = 0.0
+    else:
+        def counted(chunks):
+            nonlocal rows
+            for chunk in chunks:
+                rows += len(chunk)
+                yield chunk
+
+        # The same body the endpoint returns; close() is what the WSGI server calls when the client goes away
+        body = ClosingStream(conn, cursor, export_chunks(counted(iter_chunks(cursor, chunk_size)), fmt, compress))
+        for part in body:
+            size += len(part)
+            if cancel_after and rows >= cancel_after:
+                break
+        elapsed = time.monotonic() - started
+        body.close()
+        close_seconds = time.monotonic() - started - elapsed
+
+    results.put({
+        'format': fmt + (' cancel' if cancel_after else ''),
+        'gzip': compress,
+        'rows': rows,
+        'seconds': elapsed,
+        'close_seconds': close_seconds,
+        'bytes': size,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_growth_mb': peak_rss_mb() - baseline
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--db', default=os.path.join('/tmp', 'detections_export_bench.sqlite'))
+    parser.add_argument('--mysql', action='store_true', help='read the configured MySQL database instead of SQLite')
+    parser.add_argument('--formats', default='csv,ndjson,parquet')
+    parser.add_argument('--gzip', action='store_true', help='also run each format gzip-compressed')
+    parser.add_argument('--naive', action='store_true', help='also run the fetchall + JSON list baseline')
+    parser.add_argument('--cancel-after', type=int, default=0, help='also stop each format after this many rows')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    source = 'mysql' if args.mysql else 'sqlite'
+    if source == 'sqlite':
+        build_sqlite(args.db, args.rows)
+
+    runs = []
+    for fmt in args.formats.split(','):
+        if fmt == 'parquet' and not parquet_available():
+            print("Skipping parquet: pyarrow is not installed")
+            continue
+        runs.append((fmt, False, 0))
+        if args.gzip:
+            runs.append((fmt, True, 0))
+        if args.cancel_after:
+            runs.append((fmt, args.gzip, args.cancel_after))
+    if args.naive:
+        runs.append(('naive-json', False, 0))
+
+    # A fresh process per run, so each peak RSS reading belongs to that run alone
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    print(f"{'format':<16}{'gzip':<6}{'rows':>10}{'seconds':>10}{'rows/s':>11}{'close s':>9}"
+          f"{'output MB':>11}{'peak RSS MB':>13}{'growth MB':>11}")
+    for fmt, compress, cancel_after in runs:
+        process = context.Process(target=run_export,
+                                  args=(source, args.db, fmt, compress, cancel_after, args.chunk_size, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"{fmt:<16}{'yes' if compress else 'no':<6}failed (exit code {process.exitcode})")
+            continue
+        result = results.get()
+        print(f"{result['format']:<16}{'yes' if result['gzip'] else 'no':<6}{result['rows']:>10}"
+              f"{result['seconds']:>10.1f}{result['rows'] / max(result['seconds'], 1e-9):>11.0f}"
+              f"{result['close_seconds']:>9.2f}{result['bytes'] / 1e6:>11.1f}"
+              f"{result['peak_rss_mb']:>13.1f}{result['peak_rss_growth_mb']:>11.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Socket.IO fan-out benchmark.
+
+Starts the local broker, several Socket.IO server processes sharing it, and many
+clients spread over those servers, each in a user_<id> room. A write-only emitter
+(standing in for a camera worker process) then publishes alerts to the rooms and
+the script reports how many were delivered and how late.
+
+Needs the client extras as well: pip install "python-socketio[client]"
+
+    cd backend
+    python benchmarks/socketio_fanout.py --servers 2 --clients 500 --rooms 100 --messages 2000 --rate 500
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BROKER_URL = 'local://127.0.0.1:5099'
+
+def run_server(port):
+    from flask import Flask, request
+    from flask_socketio import SocketIO, join_room
+    from services.message_queue import LocalBrokerManager
+
+    app = Flask(__name__)
+    sio = SocketIO(app, cors_allowed_origins='*', client_manager=LocalBrokerManager(BROKER_URL))
+
+    @sio.on('connect')
+    def connect():
+        join_room(request.args.get('room'))
+
+    sio.run(app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True)
+
+def run_broker():
+    from services.message_queue import run_broker as broker
+    broker(BROKER_URL)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=200, help='alerts published per second')
+    parser.add_argument('--base-port', type=int, default=5600)
+    args = parser.parse_args()
+
+    os.environ['SOCKETIO_MESSAGE_QUEUE'] = BROKER_URL
+    # The broker refuses to run without a private key; spawned processes inherit this one
+    os.environ.setdefault('SOCKETIO_BROKER_AUTHKEY', secrets.token_hex(16))
+    import socketio
+    from services.message_queue import LocalBrokerManager
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_broker, daemon=True)]
+    processes += [context.Process(target=run_server, args=(args.base_port + index,), daemon=True)
+                  for index in range(args.servers)]
+    for process in processes:
+        process.start()
+        time.sleep(0.5)
+
+    lock = threading.Lock()
+    latencies = []
+    received = [0]
+
+    def on_alert(data):
+        with lock:
+            received[0] += 1
+            latencies.append(time.time() - data['sent_at'])
+
+    clients = []
+    started = time.monotonic()
+    for index in range(args.clients):
+        client = socketio.Client()
+        client.on('detection_alert', on_alert)
+        port = args.base_port + index % args.servers
+        client.connect(f"http://127.0.0.1:{port}?room=user_{index % args.rooms}", transports=['websocket'])
+        clients.append(client)
+    print(f"Connected {len(clients)} clients to {args.servers} servers in {time.monotonic() - started:.1f}s")
+
+    # Subscribers per room decide how many deliveries each alert should produce
+    members = [0] * args.rooms
+    for index in range(args.clients):
+        members[index % args.rooms] += 1
+
+    emitter = LocalBrokerManager(BROKER_URL, write_only=True)
+    expected = 0
+    started = time.monotonic()
+    for index in range(args.messages):
+        room = index % args.rooms
+        expected += members[room]
+        emitter.emit('detection_alert', {'id': index, 'sent_at': time.time()}, room=f"user_{room}")
+        delay = started + (index + 1) / args.rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    publish_time = time.monotonic() - started
+
+    # Give in-flight deliveries a moment to land
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and received[0] < expected:
+        time.sleep(0.1)
+    total_time = time.monotonic() - started
+
+    with lock:
+        samples = list(latencies)
+    print(f"Published {args.messages} alerts in {publish_time:.2f}s ({args.messages / publish_time:.0f}/s)")
+    print(f"Delivered {received[0]}/{expected} ({received[0] / total_time:.0f} deliveries/s)")
+    if samples:
+        print(f"Latency ms: avg {statistics.mean(samples) * 1000:.1f}, "
+              f"p50 {percentile(samples, 0.5) * 1000:.1f}, "
+              f"p95 {percentile(samples, 0.95) * 1000:.1f}, "
+              f"p99 {percentile(samples, 0.99) * 1000:.1f}")
+
+    for client in clients:
+        client.disconnect()
+    for process in processes:
+        process.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,11 @@ DB_CONFIG = {
     'password': os.environ.get('DB_PASSWORD', '')  # XAMPP default
 }
 
+# Database connection pool
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 20))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 5))
+
 # AI Model API Keys
 AI_MODEL_KEYS = {
     "AIcrowd_v1": os.environ.get('API_KEY_CROWD', "api_key_crowd_123"),
@@ -25,3 +30,97 @@ AI_MODEL_ENDPOINTS = {
     "AIobject_v1": os.environ.get('ENDPOINT_OBJECT', "https://aiobject-v1.onrender.com/detect")
 }
 
+
+# AI inference dispatch
+INFERENCE_MAX_WORKERS = int(os.environ.get('INFERENCE_MAX_WORKERS', 32))
+INFERENCE_MAX_IN_FLIGHT = int(os.environ.get('INFERENCE_MAX_IN_FLIGHT', 64))
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 5))
+
+# Per-model circuit breaker: opens after consecutive failures, probes again after the reset timeout
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get('CIRCUIT_HALF_OPEN_PROBES', 1))
+
+# Per-model adaptive concurrency (AIMD): the limit is halved when latency exceeds TOLERANCE x the no-load latency
+ADAPTIVE_INITIAL_LIMIT = int(os.environ.get('ADAPTIVE_INITIAL_LIMIT', 4))
+ADAPTIVE_MIN_LIMIT = int(os.environ.get('ADAPTIVE_MIN_LIMIT', 1))
+ADAPTIVE_MAX_LIMIT = int(os.environ.get('ADAPTIVE_MAX_LIMIT', 32))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.environ.get('ADAPTIVE_LATENCY_TOLERANCE', 2.0))
+
+# Micro-batching for models with a batch_endpoint_url (overridable per model)
+INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', 8))
+INFERENCE_BATCH_MAX_WAIT_MS = int(os.environ.get('INFERENCE_BATCH_MAX_WAIT_MS', 20))
+
+# Keep-alive HTTP connections per model endpoint (overridable with models.pool_size)
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+# Batched detection writes (group commit)
+DETECTION_BATCH_SIZE = int(os.environ.get('DETECTION_BATCH_SIZE', 100))
+DETECTION_FLUSH_INTERVAL = float(os.environ.get('DETECTION_FLUSH_INTERVAL', 0.2))
+DETECTION_QUEUE_SIZE = int(os.environ.get('DETECTION_QUEUE_SIZE', 10000))
+
+# Alert aggregation: hits of the same camera/model/type closer than the cooldown form one event
+# (models.alert_cooldown_seconds overrides the cooldown; 0 stores every hit)
+ALERT_COOLDOWN = float(os.environ.get('ALERT_COOLDOWN', 10))
+ALERT_MAX_EVENT_DURATION = float(os.environ.get('ALERT_MAX_EVENT_DURATION', 300))
+
+# Rows fetched per chunk when streaming large listings
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 500))
+
+# Bulk exports: rows per fetch (and per Parquet row group) and gzip level for ?gzip=1
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+
+# Detections are range-partitioned by timestamp ('day' or 'month' partitions, some created ahead of time);
+# the retention job archives partitions older than DETECTION_RETENTION_DAYS to DETECTION_ARCHIVE_DIR
+# ('ndjson' gzip files, 'parquet' with pyarrow installed, or 'none' to drop without archiving) and drops them.
+# Both are opt-in: partitioning rebuilds an existing detections table and drops its foreign keys
+DETECTION_PARTITIONING = os.environ.get('DETECTION_PARTITIONING', 'False') == 'True'
+DETECTION_PARTITION_INTERVAL = os.environ.get('DETECTION_PARTITION_INTERVAL', 'month')
+DETECTION_PARTITIONS_AHEAD = int(os.environ.get('DETECTION_PARTITIONS_AHEAD', 2))
+DETECTION_RETENTION_DAYS = int(os.environ.get('DETECTION_RETENTION_DAYS', 0))
+DETECTION_ARCHIVE_DIR = os.environ.get('DETECTION_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+DETECTION_ARCHIVE_FORMAT = os.environ.get('DETECTION_ARCHIVE_FORMAT', 'ndjson')
+RETENTION_CHECK_INTERVAL = float(os.environ.get('RETENTION_CHECK_INTERVAL', 3600))
+
+# Decoded frames kept per camera in the shared grabber's ring buffer
+GRABBER_BUFFER_SIZE = int(os.environ.get('GRABBER_BUFFER_SIZE', 5))
+
+# RTSP reconnects: exponential backoff with full jitter; after MAX_ATTEMPTS in one outage the camera is reported
+# failed and retried every MAX_DELAY (0 = never reported failed)
+RTSP_RECONNECT_BASE_DELAY = float(os.environ.get('RTSP_RECONNECT_BASE_DELAY', 1))
+RTSP_RECONNECT_MAX_DELAY = float(os.environ.get('RTSP_RECONNECT_MAX_DELAY', 60))
+RTSP_RECONNECT_MAX_ATTEMPTS = int(os.environ.get('RTSP_RECONNECT_MAX_ATTEMPTS', 20))
+RTSP_MAX_CONCURRENT_CONNECTS = int(os.environ.get('RTSP_MAX_CONCURRENT_CONNECTS', 4))
+
+# Motion-gated inference
+MOTION_GATING = os.environ.get('MOTION_GATING', 'True') == 'True'
+MOTION_DEFAULT_SENSITIVITY = float(os.environ.get('MOTION_DEFAULT_SENSITIVITY', 0.5))
+MOTION_KEEPALIVE_INTERVAL = float(os.environ.get('MOTION_KEEPALIVE_INTERVAL', 10))
+MOTION_DOWNSCALE_WIDTH = int(os.environ.get('MOTION_DOWNSCALE_WIDTH', 160))
+MOTION_PIXEL_DELTA = int(os.environ.get('MOTION_PIXEL_DELTA', 25))
+
+# Perceptual-hash cache of inference responses for near-identical frames
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'True') == 'True'
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 5))
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+RESULT_CACHE_MAX_DISTANCE = int(os.environ.get('RESULT_CACHE_MAX_DISTANCE', 6))
+
+# Camera runtime: 'threads' (one thread per camera), 'async' (event-loop supervisor)
+# or 'processes' (cameras sharded across CAMERA_WORKER_PROCESSES worker processes)
+CAMERA_RUNTIME = os.environ.get('CAMERA_RUNTIME', 'threads')
+CAMERA_INTERVAL = float(os.environ.get('CAMERA_INTERVAL', 1))
+CAMERA_WORKER_BUDGET = int(os.environ.get('CAMERA_WORKER_BUDGET', 16))
+CAMERA_DECODE_WORKERS = int(os.environ.get('CAMERA_DECODE_WORKERS', 32))
+CAMERA_WORKER_PROCESSES = int(os.environ.get('CAMERA_WORKER_PROCESSES', os.cpu_count() or 2))
+
+# Socket.IO: async server mode ('' picks automatically; eventlet/gevent need their package and a matching gunicorn worker)
+# and the message queue that lets several server and camera processes share rooms: redis://, amqp://, kafka://,
+# zmq+tcp:// or local://host:port for the bundled broker (python -m services.message_queue)
+SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', '')
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+SOCKETIO_BROKER_AUTHKEY = os.environ.get('SOCKETIO_BROKER_AUTHKEY', '')
+
+# Alerts are sent per room as one 'detection_alerts' list every tick (0 sends each 'detection_alert' on its own)
+SOCKETIO_BATCH_INTERVAL = float(os.environ.get('SOCKETIO_BATCH_INTERVAL', 0.25))
+SOCKETIO_BATCH_MAX = int(os.environ.get('SOCKETIO_BATCH_MAX', 100))
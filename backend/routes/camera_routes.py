@@ -1,31 +1,66 @@
 
+import json
 from flask import Blueprint, request, jsonify, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from mysql.connector import Error
+from mysql.connector import Error, IntegrityError
 from services.db_service import get_db_connection
+from services.camera_registry import camera_registry
 from services.camera_service import generate_frames
+from services.frame_service import parse_roi
+from services.rollup_service import delete_rollups
+from services.schedule_service import MIN_INTERVAL
+from services.stream_service import STREAM_FORMATS, stream_query
 
 camera_bp = Blueprint('camera', __name__)
 
+def parse_camera_roi(camera):
+    # Return the region of interest as JSON if it's stored as a string
+    if isinstance(camera.get('roi'), str):
+        try:
+            camera['roi'] = json.loads(camera['roi'])
+        except ValueError:
+            camera['roi'] = None
+    return camera
+
+def roi_param(data):
+    # (value to store, error message); null clears the region of interest
+    roi = data.get('roi')
+    if roi is None:
+        return None, None
+    if parse_roi(roi) is None:
+        return None, "Invalid roi: expected {x, y, width, height} as fractions of the frame"
+    return json.dumps(roi), None
+
 @camera_bp.route('', methods=['GET'])
 @jwt_required()
 def get_cameras():
     current_user = get_jwt_identity()
     user_id = current_user.get('id')
     is_admin = current_user.get('role') == 'admin'
+    stream_format = request.args.get('stream')
+    
+    if stream_format and stream_format not in STREAM_FORMATS:
+        return jsonify({"error": "Invalid value for stream"}), 400
     
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
     
-    cursor = conn.cursor(dictionary=True)
-    
     if is_admin:
-        cursor.execute("SELECT * FROM cameras")
+        query, params = "SELECT * FROM cameras", ()
     else:
-        cursor.execute("SELECT * FROM cameras WHERE user_id = %s", (user_id,))
+        query, params = "SELECT * FROM cameras WHERE user_id = %s", (user_id,)
+    
+    if stream_format:
+        try:
+            return stream_query(conn, query, params, stream_format, parse_camera_roi)
+        except Error as e:
+            return jsonify({"error": f"Database error: {str(e)}"}), 500
     
-    cameras = cursor.fetchall()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, params)
+    
+    cameras = [parse_camera_roi(camera) for camera in cursor.fetchall()]
     cursor.close()
     conn.close()
     
@@ -45,6 +80,10 @@ def create_camera():
     if not data or not data.get('name') or not data.get('location') or not data.get('ip_address') or not data.get('user_id'):
         return jsonify({"error": "Missing required fields"}), 400
     
+    roi, roi_error = roi_param(data)
+    if roi_error:
+        return jsonify({"error": roi_error}), 400
+    
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
@@ -52,8 +91,9 @@ def create_camera():
     cursor = conn.cursor()
     try:
         cursor.execute(
-            "INSERT INTO cameras (name, location, ip_address, user_id, status) VALUES (%s, %s, %s, %s, %s)",
-            (data.get('name'), data.get('location'), data.get('ip_address'), data.get('user_id'), data.get('status', 'inactive'))
+            "INSERT INTO cameras (name, location, ip_address, user_id, status, motion_sensitivity, roi) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (data.get('name'), data.get('location'), data.get('ip_address'), data.get('user_id'), data.get('status', 'inactive'),
+             data.get('motion_sensitivity'), roi)
         )
         conn.commit()
         camera_id = cursor.lastrowid
@@ -74,6 +114,9 @@ def create_camera():
     cursor.close()
     conn.close()
     
+    # Start a worker right away if the camera was created active
+    camera_registry.sync_camera(camera_id)
+    
     return jsonify({
         "message": "Camera created successfully",
         "id": camera_id
@@ -102,7 +145,7 @@ def get_camera(id):
     if not is_admin and camera['user_id'] != user_id:
         return jsonify({"error": "Unauthorized"}), 403
     
-    return jsonify(camera), 200
+    return jsonify(parse_camera_roi(camera)), 200
 
 @camera_bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
@@ -118,6 +161,10 @@ def update_camera(id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
+    roi, roi_error = roi_param(data)
+    if roi_error:
+        return jsonify({"error": roi_error}), 400
+    
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
@@ -136,12 +183,16 @@ def update_camera(id):
         update_fields = []
         params = []
         
-        fields = ['name', 'location', 'ip_address', 'status', 'user_id']
+        fields = ['name', 'location', 'ip_address', 'status', 'user_id', 'motion_sensitivity']
         for field in fields:
             if field in data:
                 update_fields.append(f"{field} = %s")
                 params.append(data[field])
         
+        if 'roi' in data:
+            update_fields.append("roi = %s")
+            params.append(roi)
+        
         if not update_fields:
             cursor.close()
             conn.close()
@@ -171,6 +222,9 @@ def update_camera(id):
     cursor.close()
     conn.close()
     
+    # Apply status toggles, RTSP URL changes and other edits to the running worker
+    camera_registry.sync_camera(id)
+    
     return jsonify({"message": "Camera updated successfully"}), 200
 
 @camera_bp.route('/<int:id>', methods=['DELETE'])
@@ -200,6 +254,10 @@ def delete_camera(id):
         
         camera_name = camera[0]
         
+        # Partitioned detections have no foreign key, so nothing cascades to them or to their rollups
+        cursor.execute("DELETE FROM detections WHERE camera_id = %s", (id,))
+        delete_rollups(cursor, 'camera_id', id)
+        
         # Delete camera
         cursor.execute("DELETE FROM cameras WHERE id = %s", (id,))
         conn.commit()
@@ -220,8 +278,146 @@ def delete_camera(id):
     cursor.close()
     conn.close()
     
+    # Stop the camera's worker and release its stream
+    camera_registry.remove_camera(id)
+    
     return jsonify({"message": "Camera deleted successfully"}), 200
 
+@camera_bp.route('/<int:id>/schedules', methods=['GET'])
+@jwt_required()
+def get_camera_schedules(id):
+    current_user = get_jwt_identity()
+    user_id = current_user.get('id')
+    is_admin = current_user.get('role') == 'admin'
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection error"}), 500
+    
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT user_id FROM cameras WHERE id = %s", (id,))
+    camera = cursor.fetchone()
+    
+    if not camera:
+        cursor.close()
+        conn.close()
+        return jsonify({"error": "Camera not found"}), 404
+    
+    if not is_admin and camera['user_id'] != user_id:
+        cursor.close()
+        conn.close()
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    cursor.execute(
+        """
+        SELECT s.model_id, m.name AS model_name, s.interval_seconds, s.enabled
+        FROM camera_model_schedules s
+        JOIN models m ON s.model_id = m.id
+        WHERE s.camera_id = %s
+        ORDER BY s.model_id
+        """,
+        (id,)
+    )
+    schedules = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    
+    # Without rows the camera runs every model at the default interval
+    return jsonify(schedules), 200
+
+@camera_bp.route('/<int:id>/schedules', methods=['PUT'])
+@jwt_required()
+def update_camera_schedules(id):
+    current_user = get_jwt_identity()
+    is_admin = current_user.get('role') == 'admin'
+    
+    if not is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    data = request.get_json()
+    
+    # Replaces the camera's schedule; an empty list goes back to every model at the default interval
+    if not isinstance(data, list):
+        return jsonify({"error": "Expected a list of schedules"}), 400
+    
+    rows = []
+    for schedule in data:
+        if not isinstance(schedule, dict) or not schedule.get('model_id'):
+            return jsonify({"error": "Missing required fields"}), 400
+        model_id = schedule['model_id']
+        if not isinstance(model_id, int) or isinstance(model_id, bool):
+            return jsonify({"error": "Invalid value for model_id"}), 400
+        if any(row[1] == model_id for row in rows):
+            return jsonify({"error": f"Model {model_id} is scheduled more than once"}), 400
+        try:
+            interval_seconds = float(schedule.get('interval_seconds'))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid value for interval_seconds"}), 400
+        if interval_seconds < MIN_INTERVAL:
+            return jsonify({"error": f"interval_seconds must be at least {MIN_INTERVAL}"}), 400
+        rows.append((id, model_id, interval_seconds, bool(schedule.get('enabled', True))))
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection error"}), 500
+    
+    cursor = conn.cursor()
+    
+    try:
+        # Check if camera exists
+        cursor.execute("SELECT id FROM cameras WHERE id = %s", (id,))
+        if not cursor.fetchone():
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Camera not found"}), 404
+        
+        # Check that every scheduled model exists
+        if rows:
+            model_ids = [row[1] for row in rows]
+            cursor.execute(
+                f"SELECT id FROM models WHERE id IN ({', '.join(['%s'] * len(model_ids))})",
+                model_ids
+            )
+            missing = set(model_ids) - {row[0] for row in cursor.fetchall()}
+            if missing:
+                cursor.close()
+                conn.close()
+                return jsonify({"error": f"AI model not found: {', '.join(str(model_id) for model_id in sorted(missing))}"}), 400
+        
+        cursor.execute("DELETE FROM camera_model_schedules WHERE camera_id = %s", (id,))
+        if rows:
+            cursor.executemany(
+                "INSERT INTO camera_model_schedules (camera_id, model_id, interval_seconds, enabled) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+        
+        # Log action
+        cursor.execute(
+            "INSERT INTO audit_logs (user_id, action, timestamp) VALUES (%s, %s, NOW())",
+            (current_user.get('id'), f"Updated schedules of camera {id}")
+        )
+        conn.commit()
+        
+    except IntegrityError as e:
+        # A model deleted since the check above
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        return jsonify({"error": f"Invalid schedule: {str(e)}"}), 400
+    except Error as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    
+    cursor.close()
+    conn.close()
+    
+    # The camera's worker reloads its schedule
+    camera_registry.reload_camera(id)
+    
+    return jsonify({"message": "Camera schedules updated successfully"}), 200
+
 @camera_bp.route('/<int:camera_id>/stream')
 @jwt_required()
 def stream_camera(camera_id):
@@ -246,7 +442,7 @@ def stream_camera(camera_id):
         return jsonify({"error": "Unauthorized"}), 403
     
     return Response(
-        generate_frames(camera.get('ip_address')),
+        generate_frames(camera_id, camera.get('ip_address')),
         mimetype='multipart/x-mixed-replace; boundary=frame'
     )
 
@@ -1,56 +1,418 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from mysql.connector import Error
 from services.db_service import get_db_connection
+from services.export_service import (EXPORT_COLUMNS, EXPORT_FORMATS, export_chunks, export_filename,
+                                     iter_chunks, parquet_available)
+from services.retention_service import archived_partitions, iter_archived_rows
+from services.rollup_service import ROLLUP_TABLES, bucket_start, write_rollups
+from services.stream_service import (STREAM_FORMATS, ClosingStream, open_stream, stream_query, stream_rows,
+                                     streaming_response)
+from datetime import datetime, timedelta
+from itertools import islice
+import base64
 import json
 
 detection_bp = Blueprint('detection', __name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Default /stats window per granularity, and how many cameras the ranking returns
+DEFAULT_STATS_WINDOW = {'minute': timedelta(hours=1), 'hour': timedelta(days=1), 'day': timedelta(days=30)}
+DEFAULT_TOP_CAMERAS = 5
+
+def encode_cursor(detection):
+    raw = json.dumps([detection['timestamp'].isoformat(), detection['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, detection_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(timestamp), int(detection_id)
+
+def parse_timestamp(value):
+    # Stored timestamps are naive server-local time; an ISO string with an offset is converted to match
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def _parse_arg(args, name, convert):
+    try:
+        return convert(args[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}")
+
+def build_detection_filters(args, current_user):
+    # WHERE conditions shared by the detection listing endpoints; raises ValueError on bad input
+    conditions = []
+    params = []
+    
+    if current_user.get('role') != 'admin':
+        conditions.append("d.user_id = %s")
+        params.append(current_user.get('id'))
+    elif args.get('user_id'):
+        conditions.append("d.user_id = %s")
+        params.append(_parse_arg(args, 'user_id', int))
+    
+    if args.get('camera_id'):
+        conditions.append("d.camera_id = %s")
+        params.append(_parse_arg(args, 'camera_id', int))
+    
+    if args.get('model_id'):
+        conditions.append("d.model_id = %s")
+        params.append(_parse_arg(args, 'model_id', int))
+    
+    if args.get('type'):
+        conditions.append("d.detection_type = %s")
+        params.append(args['type'])
+    
+    if args.get('min_confidence'):
+        conditions.append("d.confidence_score >= %s")
+        params.append(_parse_arg(args, 'min_confidence', float))
+    
+    if args.get('max_confidence'):
+        conditions.append("d.confidence_score <= %s")
+        params.append(_parse_arg(args, 'max_confidence', float))
+    
+    if args.get('since'):
+        conditions.append("d.timestamp >= %s")
+        params.append(_parse_arg(args, 'since', parse_timestamp))
+    
+    if args.get('until'):
+        conditions.append("d.timestamp < %s")
+        params.append(_parse_arg(args, 'until', parse_timestamp))
+    
+    return conditions, params
+
+def parse_metadata(detection):
+    # Format metadata as JSON if it's stored as a string
+    if isinstance(detection.get('metadata'), str):
+        try:
+            detection['metadata'] = json.loads(detection['metadata'])
+        except:
+            detection['metadata'] = {}
+    return detection
+
 @detection_bp.route('', methods=['GET'])
 @jwt_required()
 def get_detections():
     current_user = get_jwt_identity()
-    user_id = current_user.get('id')
-    is_admin = current_user.get('role') == 'admin'
+    stream_format = request.args.get('stream')
+    
+    if stream_format and stream_format not in STREAM_FORMATS:
+        return jsonify({"error": "Invalid value for stream"}), 400
+    
+    try:
+        conditions, params = build_detection_filters(request.args, current_user)
+        if request.args.get('limit'):
+            limit = _parse_arg(request.args, 'limit', int)
+            if not stream_format:
+                limit = min(limit, MAX_PAGE_SIZE)
+        else:
+            # Streams are unbounded unless a limit is given; pages default to DEFAULT_PAGE_SIZE
+            limit = None if stream_format else DEFAULT_PAGE_SIZE
+        if limit is not None and limit < 1:
+            raise ValueError("Invalid value for limit")
+        
+        # Keyset pagination: continue strictly after the last (timestamp, id) of the previous page
+        if request.args.get('cursor'):
+            cursor_timestamp, cursor_id = _parse_arg(request.args, 'cursor', decode_cursor)
+            conditions.append("(d.timestamp < %s OR (d.timestamp = %s AND d.id < %s))")
+            params.extend([cursor_timestamp, cursor_timestamp, cursor_id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
     
+    # Join with cameras to get camera name
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT d.*, c.name as camera_name 
+    FROM detections d
+    JOIN cameras c ON d.camera_id = c.id
+    {where}
+    ORDER BY d.timestamp DESC, d.id DESC
+    """
+    
+    if stream_format:
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+        try:
+            return stream_query(conn, query, params, stream_format, parse_metadata)
+        except Error as e:
+            return jsonify({"error": f"Database error: {str(e)}"}), 500
+    
     cursor = conn.cursor(dictionary=True)
     
-    # Join with cameras to get camera name
-    if is_admin:
-        query = """
-        SELECT d.*, c.name as camera_name 
-        FROM detections d
-        JOIN cameras c ON d.camera_id = c.id
-        ORDER BY d.timestamp DESC
-        """
-        cursor.execute(query)
-    else:
-        query = """
-        SELECT d.*, c.name as camera_name 
-        FROM detections d
-        JOIN cameras c ON d.camera_id = c.id
-        WHERE d.user_id = %s
-        ORDER BY d.timestamp DESC
-        """
-        cursor.execute(query, (user_id,))
+    # One extra row tells us whether there is a next page
+    cursor.execute(query + " LIMIT %s", params + [limit + 1])
     
     detections = cursor.fetchall()
     cursor.close()
     conn.close()
     
-    # Format metadata as JSON if it's stored as a string
+    next_cursor = None
+    if len(detections) > limit:
+        detections = detections[:limit]
+        next_cursor = encode_cursor(detections[-1])
+    
     for detection in detections:
-        if isinstance(detection.get('metadata'), str):
-            try:
-                detection['metadata'] = json.loads(detection['metadata'])
-            except:
-                detection['metadata'] = {}
+        parse_metadata(detection)
+    
+    response = jsonify(detections)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@detection_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_detections():
+    current_user = get_jwt_identity()
+    export_format = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Invalid value for format"}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({"error": "Parquet export is not available on this server"}), 400
+    
+    try:
+        conditions, params = build_detection_filters(request.args, current_user)
+        limit = _parse_arg(request.args, 'limit', int) if request.args.get('limit') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "Invalid value for limit"}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection error"}), 500
     
-    return jsonify(detections), 200
+    # Oldest first, walking the same (timestamp, id) indexes as the listing
+    columns = ', '.join('c.name AS camera_name' if column == 'camera_name' else f"d.{column}" for column in EXPORT_COLUMNS)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT {columns}
+    FROM detections d
+    JOIN cameras c ON d.camera_id = c.id
+    {where}
+    ORDER BY d.timestamp, d.id
+    """
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    
+    try:
+        cursor = open_stream(conn, query, params, dictionary=False)
+    except Error as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    
+    # Rows are fetched, encoded and compressed one chunk at a time as the client reads
+    body = ClosingStream(conn, cursor, export_chunks(iter_chunks(cursor), export_format, compress))
+    response = streaming_response(body, 'application/gzip' if compress else EXPORT_FORMATS[export_format][0])
+    response.headers['Content-Disposition'] = f"attachment; filename={export_filename(export_format, compress)}"
+    return response
+
+def build_rollup_filters(args, current_user):
+    # WHERE conditions on a rollup table; raises ValueError on bad input
+    conditions = []
+    params = []
+    
+    if current_user.get('role') != 'admin':
+        conditions.append("r.user_id = %s")
+        params.append(current_user.get('id'))
+    elif args.get('user_id'):
+        conditions.append("r.user_id = %s")
+        params.append(_parse_arg(args, 'user_id', int))
+    
+    if args.get('camera_id'):
+        conditions.append("r.camera_id = %s")
+        params.append(_parse_arg(args, 'camera_id', int))
+    
+    if args.get('model_id'):
+        conditions.append("r.model_id = %s")
+        params.append(_parse_arg(args, 'model_id', int))
+    
+    if args.get('type'):
+        conditions.append("r.detection_type = %s")
+        params.append(args['type'])
+    
+    return conditions, params
+
+def _summary(row):
+    count = int(row['detection_count'] or 0)
+    return {
+        'count': count,
+        'hits': int(row['hit_count'] or 0),
+        'avg_confidence': round(row['confidence_sum'] / count, 4) if count else None,
+        'max_confidence': round(row['confidence_max'], 4) if row['confidence_max'] is not None else None
+    }
+
+@detection_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_detection_stats():
+    # Dashboard aggregates, served from the rollup tables rather than the detections table
+    current_user = get_jwt_identity()
+    granularity = request.args.get('granularity', 'hour')
+    
+    if granularity not in ROLLUP_TABLES:
+        return jsonify({"error": "Invalid value for granularity"}), 400
+    
+    try:
+        conditions, params = build_rollup_filters(request.args, current_user)
+        until = _parse_arg(request.args, 'until', parse_timestamp) if request.args.get('until') else datetime.now()
+        since = _parse_arg(request.args, 'since', parse_timestamp) if request.args.get('since') else until - DEFAULT_STATS_WINDOW[granularity]
+        top = _parse_arg(request.args, 'top', int) if request.args.get('top') else DEFAULT_TOP_CAMERAS
+        if top < 1:
+            raise ValueError("Invalid value for top")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    conditions += ["r.bucket_start >= %s", "r.bucket_start < %s"]
+    params += [bucket_start(since, granularity), until]
+    where = " AND ".join(conditions)
+    table = ROLLUP_TABLES[granularity]
+    totals_sql = "SUM(r.detection_count) AS detection_count, SUM(r.hit_count) AS hit_count, SUM(r.confidence_sum) AS confidence_sum, MAX(r.confidence_max) AS confidence_max"
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection error"}), 500
+    
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT {totals_sql} FROM {table} r WHERE {where}", params)
+        totals = _summary(cursor.fetchone())
+        
+        cursor.execute(
+            f"SELECT r.bucket_start, {totals_sql} FROM {table} r WHERE {where} GROUP BY r.bucket_start ORDER BY r.bucket_start",
+            params
+        )
+        buckets = [dict(_summary(row), bucket=row['bucket_start'].isoformat()) for row in cursor.fetchall()]
+        
+        cursor.execute(
+            f"SELECT r.detection_type, {totals_sql} FROM {table} r WHERE {where} GROUP BY r.detection_type ORDER BY detection_count DESC",
+            params
+        )
+        by_type = [dict(_summary(row), type=row['detection_type']) for row in cursor.fetchall()]
+        
+        cursor.execute(
+            f"""
+            SELECT r.camera_id, c.name AS camera_name, {totals_sql}
+            FROM {table} r
+            LEFT JOIN cameras c ON r.camera_id = c.id
+            WHERE {where}
+            GROUP BY r.camera_id, c.name
+            ORDER BY detection_count DESC
+            LIMIT %s
+            """,
+            params + [top]
+        )
+        top_cameras = [
+            dict(_summary(row), camera_id=row['camera_id'], camera_name=row['camera_name'])
+            for row in cursor.fetchall()
+        ]
+    except Error as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    finally:
+        cursor.close()
+        conn.close()
+    
+    return jsonify({
+        'granularity': granularity,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'totals': totals,
+        'buckets': buckets,
+        'by_type': by_type,
+        'top_cameras': top_cameras
+    }), 200
+
+def build_archive_filter(args, current_user):
+    # The listing filters applied to archived rows, which are read from files rather than MySQL
+    checks = []
+    
+    if current_user.get('role') != 'admin':
+        checks.append(('user_id', current_user.get('id')))
+    elif args.get('user_id'):
+        checks.append(('user_id', _parse_arg(args, 'user_id', int)))
+    
+    for name, column in (('camera_id', 'camera_id'), ('model_id', 'model_id')):
+        if args.get(name):
+            checks.append((column, _parse_arg(args, name, int)))
+    
+    if args.get('type'):
+        checks.append(('detection_type', args['type']))
+    
+    min_confidence = _parse_arg(args, 'min_confidence', float) if args.get('min_confidence') else None
+    max_confidence = _parse_arg(args, 'max_confidence', float) if args.get('max_confidence') else None
+    since = _parse_arg(args, 'since', parse_timestamp) if args.get('since') else None
+    until = _parse_arg(args, 'until', parse_timestamp) if args.get('until') else None
+    
+    def matches(row):
+        if any(row.get(column) != value for column, value in checks):
+            return False
+        if min_confidence is not None and row['confidence_score'] < min_confidence:
+            return False
+        if max_confidence is not None and row['confidence_score'] > max_confidence:
+            return False
+        if since or until:
+            timestamp = datetime.fromisoformat(row['timestamp'])
+            if (since and timestamp < since) or (until and timestamp >= until):
+                return False
+        return True
+    
+    return since, until, matches
+
+@detection_bp.route('/archive', methods=['GET'])
+@jwt_required()
+def get_archived_detections():
+    current_user = get_jwt_identity()
+    stream_format = request.args.get('stream', 'json')
+    
+    if stream_format not in STREAM_FORMATS:
+        return jsonify({"error": "Invalid value for stream"}), 400
+    
+    try:
+        since, until, matches = build_archive_filter(request.args, current_user)
+        limit = _parse_arg(request.args, 'limit', int) if request.args.get('limit') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "Invalid value for limit"}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection error"}), 500
+    
+    # Camera names are looked up once; archived rows only carry the camera id
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name FROM cameras")
+    camera_names = dict(cursor.fetchall())
+    cursor.close()
+    conn.close()
+    
+    def with_camera_name(detection):
+        detection['camera_name'] = camera_names.get(detection['camera_id'])
+        return detection
+    
+    # Archives are read file by file as the response is consumed, oldest first
+    rows = filter(matches, iter_archived_rows(since, until))
+    return stream_rows(islice(rows, limit), stream_format, with_camera_name)
+
+@detection_bp.route('/archive/partitions', methods=['GET'])
+@jwt_required()
+def get_archived_partitions():
+    # Archived time ranges, without their file locations
+    partitions = [
+        {key: entry[key] for key in ('partition', 'format', 'from', 'to', 'rows', 'first_timestamp', 'last_timestamp', 'archived_at')}
+        for entry in archived_partitions()
+    ]
+    return jsonify(partitions), 200
 
 @detection_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
@@ -106,18 +468,23 @@ def delete_detection(id):
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
     
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     
     try:
         # Check if detection exists
-        cursor.execute("SELECT id FROM detections WHERE id = %s", (id,))
-        if not cursor.fetchone():
+        cursor.execute(
+            "SELECT timestamp, user_id, camera_id, model_id, detection_type, confidence_score, hit_count FROM detections WHERE id = %s",
+            (id,)
+        )
+        detection = cursor.fetchone()
+        if not detection:
             cursor.close()
             conn.close()
             return jsonify({"error": "Detection not found"}), 404
         
-        # Delete detection
+        # Delete detection and take it out of the dashboard rollups (their max stays an upper bound)
         cursor.execute("DELETE FROM detections WHERE id = %s", (id,))
+        write_rollups(cursor, [(detection, -1, -detection['hit_count'], -detection['confidence_score'], 0)])
         conn.commit()
         
         # Log action
@@ -3,9 +3,33 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from mysql.connector import Error
 from services.db_service import get_db_connection
+from services.circuit_breaker import get_guard_stats
+from services.http_service import get_http_stats
+from services.inference_service import forget_batch_support
+from services.frame_service import COLOR_SPACES
+from services.rollup_service import delete_rollups
 
 model_bp = Blueprint('model', __name__)
 
+# Everything but api_key
+MODEL_COLUMNS = (
+    "id, name, endpoint_url, description, input_width, input_height, jpeg_quality, color_space, "
+    "timeout_seconds, pool_size, batch_endpoint_url, batch_size, batch_max_wait_ms, alert_cooldown_seconds, created_at"
+)
+
+def frame_settings_error(data):
+    # Error message for invalid frame preparation settings, or None; a null size or quality keeps the default
+    for field in ('input_width', 'input_height'):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            return f"{field} must be a positive integer"
+    quality = data.get('jpeg_quality')
+    if quality is not None and (not isinstance(quality, int) or isinstance(quality, bool) or not 1 <= quality <= 100):
+        return "jpeg_quality must be an integer from 1 to 100"
+    if 'color_space' in data and data['color_space'] not in COLOR_SPACES:
+        return f"color_space must be one of: {', '.join(COLOR_SPACES)}"
+    return None
+
 @model_bp.route('', methods=['GET'])
 @jwt_required()
 def get_models():
@@ -20,7 +44,7 @@ def get_models():
         return jsonify({"error": "Database connection error"}), 500
     
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, name, endpoint_url, description, created_at FROM models")  # Not returning api_key
+    cursor.execute(f"SELECT {MODEL_COLUMNS} FROM models")  # Not returning api_key
     models = cursor.fetchall()
     cursor.close()
     conn.close()
@@ -41,6 +65,10 @@ def create_model():
     if not data or not data.get('name') or not data.get('endpoint_url') or not data.get('api_key'):
         return jsonify({"error": "Missing required fields"}), 400
     
+    settings_error = frame_settings_error(data)
+    if settings_error:
+        return jsonify({"error": settings_error}), 400
+    
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
@@ -49,10 +77,15 @@ def create_model():
     try:
         cursor.execute(
             """
-            INSERT INTO models (name, endpoint_url, api_key, description)
-            VALUES (%s, %s, %s, %s)
+            INSERT INTO models (name, endpoint_url, api_key, description, input_width, input_height, jpeg_quality, color_space, timeout_seconds, pool_size,
+                                batch_endpoint_url, batch_size, batch_max_wait_ms, alert_cooldown_seconds)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
-            (data.get('name'), data.get('endpoint_url'), data.get('api_key'), data.get('description', ''))
+            (data.get('name'), data.get('endpoint_url'), data.get('api_key'), data.get('description', ''),
+             data.get('input_width'), data.get('input_height'), data.get('jpeg_quality'), data.get('color_space', 'bgr'),
+             data.get('timeout_seconds'), data.get('pool_size'),
+             data.get('batch_endpoint_url'), data.get('batch_size'), data.get('batch_max_wait_ms'),
+             data.get('alert_cooldown_seconds'))
         )
         conn.commit()
         model_id = cursor.lastrowid
@@ -92,7 +125,7 @@ def get_model(id):
         return jsonify({"error": "Database connection error"}), 500
     
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, name, endpoint_url, description, created_at FROM models WHERE id = %s", (id,))
+    cursor.execute(f"SELECT {MODEL_COLUMNS} FROM models WHERE id = %s", (id,))
     model = cursor.fetchone()
     cursor.close()
     conn.close()
@@ -100,6 +133,11 @@ def get_model(id):
     if not model:
         return jsonify({"error": "AI model not found"}), 404
     
+    # Keep-alive connection usage for this model's endpoint
+    model['connection_stats'] = get_http_stats(model['endpoint_url'])
+    # Circuit breaker state and adaptive concurrency limit (null until the model has been called)
+    model['circuit_breaker'] = get_guard_stats(model['id'])
+    
     return jsonify(model), 200
 
 @model_bp.route('/<int:id>', methods=['PUT'])
@@ -116,6 +154,10 @@ def update_model(id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
+    settings_error = frame_settings_error(data)
+    if settings_error:
+        return jsonify({"error": settings_error}), 400
+    
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection error"}), 500
@@ -150,6 +192,13 @@ def update_model(id):
             update_fields.append("description = %s")
             params.append(data['description'])
         
+        # Frame preparation and inference settings
+        for field in ['input_width', 'input_height', 'jpeg_quality', 'color_space', 'timeout_seconds', 'pool_size',
+                      'batch_endpoint_url', 'batch_size', 'batch_max_wait_ms', 'alert_cooldown_seconds']:
+            if field in data:
+                update_fields.append(f"{field} = %s")
+                params.append(data[field])
+        
         if not update_fields:
             cursor.close()
             conn.close()
@@ -163,6 +212,9 @@ def update_model(id):
         cursor.execute(query, params)
         conn.commit()
         
+        # A batch endpoint found unsupported earlier may work now
+        forget_batch_support(id)
+        
         # Log action
         cursor.execute(
             "INSERT INTO audit_logs (user_id, action, timestamp) VALUES (%s, %s, NOW())",
@@ -217,6 +269,10 @@ def delete_model(id):
             conn.close()
             return jsonify({"error": "Cannot delete model that is in use"}), 400
         
+        # Partitioned detections have no foreign key; this also catches rows written since the check above
+        cursor.execute("DELETE FROM detections WHERE model_id = %s", (id,))
+        delete_rollups(cursor, 'model_id', id)
+        
         # Delete model
         cursor.execute("DELETE FROM models WHERE id = %s", (id,))
         conn.commit()
@@ -0,0 +1,38 @@
+from flask import current_app, request, session
+from flask_jwt_extended import decode_token
+from flask_socketio import ConnectionRefusedError, join_room
+from services.realtime_service import ADMIN_ROOM, user_room
+
+def register_socket_handlers(socketio):
+    @socketio.on('connect')
+    def handle_connect(auth=None):
+        # The JWT is checked once here; handlers read the identity from the socket's session afterwards
+        token = (auth or {}).get('token') or request.args.get('token')
+        if not token:
+            raise ConnectionRefusedError('Missing token')
+
+        try:
+            claims = decode_token(token)
+        except Exception:
+            raise ConnectionRefusedError('Invalid token')
+
+        identity = claims[current_app.config['JWT_IDENTITY_CLAIM']]
+        session['identity'] = identity
+
+        join_room(user_room(identity['id']))
+        if identity.get('role') == 'admin':
+            join_room(ADMIN_ROOM)
+
+    @socketio.on('subscribe')
+    def handle_subscribe(data):
+        # Older clients still subscribe explicitly; admins may also follow a single user's room
+        identity = session.get('identity')
+        user_id = (data or {}).get('user_id')
+        if not identity or user_id is None:
+            return {'error': 'Unauthorized'}
+
+        if user_id != identity['id'] and identity.get('role') != 'admin':
+            return {'error': 'Unauthorized'}
+
+        join_room(user_room(user_id))
+        return {'room': user_room(user_id)}
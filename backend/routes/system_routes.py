@@ -0,0 +1,39 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.alert_aggregator import alert_aggregator
+from services.circuit_breaker import get_all_guard_stats
+from services.db_service import get_pool_stats
+from services.detection_writer import detection_writer
+from services.grabber_service import get_grabber_stats
+from services.camera_registry import camera_registry
+from services.camera_service import get_all_capture_stats, get_alert_batch_stats
+from services.result_cache import result_cache
+from services.retention_service import retention_job
+from services.supervisor_service import get_supervisor_health
+from services.worker_pool import get_worker_pool_stats
+
+system_bp = Blueprint('system', __name__)
+
+@system_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_system_stats():
+    current_user = get_jwt_identity()
+    
+    # Check if user is admin
+    if current_user.get('role') != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    return jsonify({
+        'db_pool': get_pool_stats(),
+        'detection_writer': detection_writer.stats(),
+        'alert_aggregator': alert_aggregator.stats(),
+        'alert_batches': get_alert_batch_stats(),
+        'retention': retention_job.stats(),
+        'grabbers': get_grabber_stats(),
+        'running_cameras': camera_registry.running_cameras(),
+        'capture': get_all_capture_stats(),
+        'circuit_breakers': get_all_guard_stats(),
+        'result_cache': result_cache.stats() if result_cache else None,
+        'supervisor': get_supervisor_health(),
+        'camera_workers': get_worker_pool_stats()
+    }), 200
@@ -4,6 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash
 from mysql.connector import Error
 from services.db_service import get_db_connection
+from services.rollup_service import delete_rollups
 
 user_bp = Blueprint('user', __name__)
 
@@ -210,6 +211,10 @@ def delete_user(id):
         
         username = user[0]
         
+        # Partitioned detections have no foreign key, so nothing cascades to them or to their rollups
+        cursor.execute("DELETE FROM detections WHERE user_id = %s", (id,))
+        delete_rollups(cursor, 'user_id', id)
+        
         # Delete user
         cursor.execute("DELETE FROM users WHERE id = %s", (id,))
         conn.commit()
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+from datetime import datetime
+from config import ALERT_COOLDOWN, ALERT_MAX_EVENT_DURATION
+from services.detection_writer import detection_writer
+from services.realtime_service import owner_rooms
+
+# How often idle events are checked for an expired cooldown
+SWEEP_INTERVAL = 1
+
+def model_cooldown(model):
+    cooldown = model.get('alert_cooldown_seconds')
+    return float(ALERT_COOLDOWN if cooldown is None else cooldown)
+
+def _copy_outcome(future, done):
+    try:
+        future.set_result(done.result())
+    except Exception as e:
+        future.set_exception(e)
+
+class AlertAggregator:
+    """Merges consecutive hits per (camera, model, detection type) into one event with a start, end and peak."""
+
+    def __init__(self, max_duration):
+        self.max_duration = max_duration
+        self._lock = threading.Lock()
+        self._events = {}
+        self._thread = None
+        self._pid = None
+        self._stats = {'hits': 0, 'events_opened': 0, 'events_closed': 0}
+
+    def _ensure_started(self):
+        # Same per-process sweeper as the detection writer's flush thread
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._events = {}
+                self._thread = threading.Thread(target=self._run, name='alert-aggregator', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def record(self, camera_data, model, detection_data, captured_at, socketio, open_event):
+        # open_event() stores and announces a new event and returns a Future of its detection id
+        cooldown = model_cooldown(model)
+        if cooldown <= 0:
+            open_event()
+            return
+
+        self._ensure_started()
+        key = (camera_data['id'], model['id'], detection_data.get('detection_type'))
+        confidence = detection_data.get('confidence_score', 0)
+        expired = None
+        opening = None
+        with self._lock:
+            self._stats['hits'] += 1
+            event = self._events.get(key)
+            if event and (captured_at - event['last_hit'] > event['cooldown']
+                          or captured_at - event['started_at'] >= self.max_duration):
+                # Quiet for longer than the cooldown, or running too long: close it and start a new one
+                expired = self._events.pop(key)
+                event = None
+
+            if event:
+                event['last_hit'] = captured_at
+                event['hit_count'] += 1
+                if confidence > event['peak_confidence']:
+                    event['peak_confidence'] = confidence
+                    event['metadata'] = detection_data.get('metadata', {})
+            else:
+                event = {
+                    'camera_data': camera_data,
+                    'socketio': socketio,
+                    'model_id': model['id'],
+                    'detection_type': key[2],
+                    'cooldown': cooldown,
+                    'started_at': captured_at,
+                    'last_hit': captured_at,
+                    'hit_count': 1,
+                    'first_confidence': confidence,
+                    'peak_confidence': confidence,
+                    'metadata': detection_data.get('metadata', {}),
+                    # Set before the lock is released, so a close racing the insert always has something to wait on
+                    'future': Future()
+                }
+                self._events[key] = event
+                self._stats['events_opened'] += 1
+                opening = event
+
+        if expired:
+            self._close(expired)
+        if opening:
+            # Only the first hit of an event becomes a row and an alert
+            try:
+                open_event().add_done_callback(partial(_copy_outcome, opening['future']))
+            except Exception as e:
+                opening['future'].set_exception(e)
+                raise
+
+    def _run(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            now = time.time()
+            with self._lock:
+                expired = [key for key, event in self._events.items() if now - event['last_hit'] > event['cooldown']]
+                events = [self._events.pop(key) for key in expired]
+            for event in events:
+                self._close(event)
+
+    def _close(self, event):
+        # Fill in the end, hit count and peak on the event's row, then tell the owner it is over
+        with self._lock:
+            self._stats['events_closed'] += 1
+        # A single hit is already fully described by the row and alert that opened the event
+        if event['hit_count'] == 1:
+            return
+        future = event['future']
+
+        camera_data = event['camera_data']
+        started_at = datetime.fromtimestamp(event['started_at'])
+        ended_at = datetime.fromtimestamp(event['last_hit'])
+
+        def write_update(future):
+            try:
+                detection_id = future.result()
+            except Exception:
+                # The opening insert failed and already reported it
+                return
+
+            detection_writer.submit_update(detection_id, {
+                'ended_at': ended_at,
+                'hit_count': event['hit_count'],
+                'confidence_score': event['peak_confidence'],
+                'metadata': event['metadata'],
+                # The rollups counted the first hit when the row was inserted
+                'rollup': {
+                    'row': {
+                        'timestamp': started_at,
+                        'user_id': camera_data['user_id'],
+                        'camera_id': camera_data['id'],
+                        'model_id': event['model_id'],
+                        'detection_type': event['detection_type']
+                    },
+                    'hits': event['hit_count'] - 1,
+                    'confidence_delta': event['peak_confidence'] - event['first_confidence']
+                }
+            })
+            event['socketio'].emit('detection_update', {
+                'id': detection_id,
+                'camera_id': camera_data['id'],
+                'camera_name': camera_data['name'],
+                'user_id': camera_data['user_id'],
+                'type': event['detection_type'],
+                'confidence': event['peak_confidence'],
+                'timestamp': started_at.isoformat(),
+                'ended_at': ended_at.isoformat(),
+                'hit_count': event['hit_count'],
+                'metadata': event['metadata']
+            }, room=owner_rooms(camera_data['user_id']))
+
+        future.add_done_callback(write_update)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_events'] = len(self._events)
+        return stats
+
+alert_aggregator = AlertAggregator(ALERT_MAX_EVENT_DURATION)
@@ -0,0 +1,107 @@
+import threading
+from services.db_service import get_db_connection
+from services.grabber_service import retain_grabber, release_grabber
+
+# Changing any of these requires the camera's detection loop to reload the row
+RELOAD_FIELDS = ('name', 'user_id', 'motion_sensitivity', 'roi')
+
+# Seconds a restarting camera's grabber is kept open for the replacement worker
+RESTART_GRACE_PERIOD = 5
+
+def _load_camera(camera_id):
+    conn = get_db_connection()
+    if not conn:
+        print(f"Database connection error when syncing camera {camera_id}")
+        return None
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM cameras WHERE id = %s", (camera_id,))
+    camera = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return camera
+
+class CameraRegistry:
+    """Tracks which cameras run in the active camera runtime and applies camera CRUD without a restart."""
+
+    def __init__(self):
+        # Only set in the process that ran start_camera_threads. Camera CRUD served by any other process
+        # is a no-op here and reaches the cameras when the camera process restarts.
+        self.runtime = None
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    def start(self, runtime, cameras):
+        with self._lock:
+            self.runtime = runtime
+            for camera in cameras:
+                self._cameras[camera['id']] = camera
+                runtime.add_camera(camera)
+
+    def sync_camera(self, camera_id):
+        # Bring the runtime in line with the camera's current row
+        if self.runtime is None:
+            return
+
+        camera = _load_camera(camera_id)
+        with self._lock:
+            current = self._cameras.get(camera_id)
+
+            if camera is None or camera['status'] != 'active':
+                if current:
+                    self._stop(camera_id)
+                return
+
+            if current is None:
+                self._cameras[camera_id] = camera
+                self.runtime.add_camera(camera)
+                print(f"Started camera {camera_id} - {camera['name']}")
+                return
+
+            self._cameras[camera_id] = camera
+            restart = any(camera.get(field) != current.get(field) for field in RELOAD_FIELDS)
+            if camera['ip_address'] != current['ip_address']:
+                # Hot swap: the shared grabber reopens on the new URL between frames. Without a streaming
+                # grabber to hand over, the worker starts again on the new URL instead.
+                restart = not self.runtime.swap_source(camera) or restart
+            if restart:
+                self._restart(camera)
+
+    def reload_camera(self, camera_id):
+        # Restart a running camera's worker so it picks up settings stored outside the camera row
+        if self.runtime is None:
+            return
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            if camera:
+                self._restart(camera)
+
+    def remove_camera(self, camera_id):
+        if self.runtime is None:
+            return
+        with self._lock:
+            if camera_id in self._cameras:
+                self._stop(camera_id)
+
+    def _stop(self, camera_id):
+        self._cameras.pop(camera_id, None)
+        # The worker exits at its next tick and releases the camera's VideoCapture
+        self.runtime.remove_camera(camera_id)
+        print(f"Stopped camera {camera_id}")
+
+    def _restart(self, camera):
+        # Hold the grabber open so viewers and the stream survive the worker restart
+        grabber = retain_grabber(camera['id'])
+        try:
+            self.runtime.remove_camera(camera['id'])
+            self.runtime.add_camera(camera)
+        finally:
+            if grabber:
+                # The new worker subscribes asynchronously, so let go only after a grace period
+                threading.Timer(RESTART_GRACE_PERIOD, release_grabber, args=(grabber,)).start()
+
+    def running_cameras(self):
+        with self._lock:
+            return sorted(self._cameras)
+
+camera_registry = CameraRegistry()
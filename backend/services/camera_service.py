@@ -1,20 +1,127 @@
 
 import threading
 import time
-import cv2
-import json
-import requests
 from datetime import datetime
-from mysql.connector import Error
-from flask_socketio import join_room
-from config import AI_MODEL_KEYS
+from config import MOTION_GATING, CAMERA_RUNTIME, CAMERA_INTERVAL
+from services.alert_aggregator import alert_aggregator
+from services.camera_registry import camera_registry
 from services.db_service import get_db_connection
+from services.detection_writer import detection_writer
+from services.frame_service import FramePreparer, parse_roi
+from services.grabber_service import acquire_grabber, release_grabber, swap_grabber_source
+from services.inference_service import dispatch_frame
+from services.metrics_service import TimingStat
+from services.motion_service import MotionGate
+from services.realtime_service import BatchingEmitter, owner_rooms
+from services.schedule_service import CameraSchedule, fetch_schedule
 
-def capture_frames(camera_id, rtsp_url, socketio, interval=1):
+_capture_stats = {}
+_capture_stats_lock = threading.Lock()
+_alert_emitter = None
+
+class CaptureStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames_sampled = 0
+        self.frames_skipped = 0
+        self.motion_skips = 0
+        self.frame_age = TimingStat()
+        self.detection_latency = TimingStat()
+        # Set by the running capture loop
+        self.schedule = None
+        self.preparer = None
+    
+    def record_sample(self, entry, last_seq):
+        with self._lock:
+            self.frames_sampled += 1
+            if last_seq:
+                self.frames_skipped += entry['seq'] - last_seq - 1
+        # How old the frame was when inference started
+        self.frame_age.record(time.time() - entry['captured_at'])
+    
+    def record_motion_skip(self):
+        with self._lock:
+            self.motion_skips += 1
+    
+    def as_dict(self):
+        with self._lock:
+            stats = {
+                'frames_sampled': self.frames_sampled,
+                'frames_skipped': self.frames_skipped,
+                'motion_skips': self.motion_skips,
+                'motion_skip_ratio': round(self.motion_skips / self.frames_sampled, 4) if self.frames_sampled else 0.0
+            }
+        stats['frame_age'] = self.frame_age.as_dict()
+        stats['detection_latency'] = self.detection_latency.as_dict()
+        stats['schedule'] = self.schedule.stats() if self.schedule else None
+        stats['frame_preparation'] = self.preparer.stats() if self.preparer else None
+        return stats
+
+def get_capture_stats(camera_id):
+    with _capture_stats_lock:
+        if camera_id not in _capture_stats:
+            _capture_stats[camera_id] = CaptureStats()
+        return _capture_stats[camera_id]
+
+def get_alert_batch_stats():
+    return _alert_emitter.stats() if _alert_emitter else None
+
+def get_all_capture_stats():
+    with _capture_stats_lock:
+        items = list(_capture_stats.items())
+    return {str(camera_id): stats.as_dict() for camera_id, stats in items}
+
+def record_detection(camera_data, model, detection_data, socketio, captured_at=None):
+    camera_id = camera_data['id']
+    user_id = camera_data['user_id']
+    detection_type = detection_data.get('detection_type')
+    confidence_score = detection_data.get('confidence_score')
+    metadata = detection_data.get('metadata', {})
+    captured_at = captured_at or time.time()
+    detected_at = datetime.fromtimestamp(captured_at)
+    
+    # Queue the row for the next group commit; the alert goes out once its id is known
+    future = detection_writer.submit({
+        'camera_id': camera_id,
+        'user_id': user_id,
+        'model_id': model['id'],
+        'detection_type': detection_type,
+        'confidence_score': confidence_score,
+        'timestamp': detected_at,
+        'metadata': metadata
+    })
+    
+    def send_alert(future):
+        try:
+            detection_id = future.result()
+        except Exception as e:
+            print(f"Database error: {str(e)}")
+            return
+        
+        # End-to-end latency: frame captured -> alert sent
+        get_capture_stats(camera_id).detection_latency.record(time.time() - captured_at)
+        
+        # Send real-time alert via WebSocket
+        socketio.emit('detection_alert', {
+            'id': detection_id,
+            'camera_id': camera_id,
+            'camera_name': camera_data['name'],
+            'user_id': user_id,
+            'type': detection_type,
+            'confidence': confidence_score,
+            'timestamp': detected_at.isoformat(),
+            'metadata': metadata
+        }, room=owner_rooms(user_id))
+    
+    future.add_done_callback(send_alert)
+    return future
+
+def load_camera_context(camera_id, interval=CAMERA_INTERVAL):
+    # Camera row and its model schedule; (None, None) when unavailable
     conn = get_db_connection()
     if not conn:
         print(f"Database connection error for camera {camera_id}")
-        return
+        return None, None
     
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT * FROM cameras WHERE id = %s", (camera_id,))
@@ -24,112 +131,149 @@ def capture_frames(camera_id, rtsp_url, socketio, interval=1):
         print(f"Camera {camera_id} not found")
         cursor.close()
         conn.close()
-        return
-    
-    user_id = camera_data['user_id']
+        return None, None
     
-    # Get all AI models
+    # Get all AI models and the rate each one runs at on this camera
     cursor.execute("SELECT * FROM models")
     models = cursor.fetchall()
+    jobs = fetch_schedule(cursor, camera_id, models, interval)
     cursor.close()
     conn.close()
     
-    cap = cv2.VideoCapture(rtsp_url)
-    if not cap.isOpened():
-        print(f"Error opening RTSP stream: {rtsp_url}")
+    return camera_data, CameraSchedule(jobs)
+
+def handle_results(camera_data, results, socketio, captured_at):
+    for model, detection_data in results:
+        # Check if confidence score is high enough
+        if detection_data.get('confidence_score', 0) >= 0.5:
+            # Consecutive hits within the model's cooldown extend one event instead of adding rows and alerts
+            alert_aggregator.record(
+                camera_data, model, detection_data, captured_at, socketio,
+                lambda model=model, detection_data=detection_data: record_detection(camera_data, model, detection_data, socketio, captured_at)
+            )
+
+def stream_status_listener(camera_data, socketio):
+    # Grabber listener that reports connection state changes to the camera owner's dashboard
+    def emit_status(camera_id, status):
+        payload = {
+            'camera_id': camera_id,
+            'camera_name': camera_data['name'],
+            'timestamp': datetime.now().isoformat()
+        }
+        payload.update(status)
+        socketio.emit('camera_status', payload, room=owner_rooms(camera_data['user_id']))
+    return emit_status
+
+def capture_frames(camera_id, rtsp_url, socketio, interval=CAMERA_INTERVAL, stop_event=None):
+    # interval is the rate for models the camera has no schedule row for
+    # stop_event lets the owner shut the worker down; without one the loop runs until the stream fails
+    stop_event = stop_event or threading.Event()
+    camera_data, schedule = load_camera_context(camera_id, interval)
+    if not camera_data:
         return
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print(f"Error reading frame from camera {camera_id}")
-            break
-        
-        # Process the frame with each AI model
-        for model in models:
-            model_id = model['id']
-            model_name = model['name']
-            endpoint_url = model['endpoint_url']
+    # Frames come from the camera's shared grabber, which MJPEG viewers also subscribe to
+    grabber = acquire_grabber(camera_id, rtsp_url)
+    status_listener = stream_status_listener(camera_data, socketio)
+    grabber.add_listener(status_listener)
+    # Only the camera's region of interest is hashed, motion-checked and sent to the models
+    preparer = FramePreparer(parse_roi(camera_data.get('roi')))
+    capture_stats = get_capture_stats(camera_id)
+    capture_stats.schedule = schedule
+    capture_stats.preparer = preparer
+    motion_gate = MotionGate(camera_data.get('motion_sensitivity')) if MOTION_GATING else None
+    last_seq = 0
+    
+    try:
+        while not stop_event.is_set():
+            # Sleep until the next model is due
+            next_due = schedule.next_due()
+            if next_due is None:
+                stop_event.wait(interval)
+                continue
+            if stop_event.wait(max(0, next_due - time.monotonic())):
+                break
             
-            # Convert frame to JPEG
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            # Latest frame wins: the grabber keeps draining the stream, so this is always the newest decode
+            entry = grabber.wait_for_frame(last_seq, timeout=max(interval, 1))
+            if entry is None:
+                # While the grabber reconnects there are simply no new frames; it only stops once it gives up
+                if grabber.stopped:
+                    print(f"Camera {camera_id} stream closed: {grabber.last_error}")
+                    break
+                continue
             
-            # Send to AI model API
-            try:
-                files = {'image': ('image.jpg', buffer.tobytes(), 'image/jpeg')}
-                headers = {
-                    'Authorization': f"Bearer {AI_MODEL_KEYS.get(model_name, '')}"
-                }
-                
-                response = requests.post(endpoint_url, files=files, headers=headers)
-                if response.status_code == 200:
-                    detection_data = response.json()
-                    
-                    # Check if confidence score is high enough
-                    if detection_data.get('confidence_score', 0) >= 0.5:
-                        # Record detection in database
-                        detection_type = detection_data.get('detection_type')
-                        confidence_score = detection_data.get('confidence_score')
-                        metadata = detection_data.get('metadata', {})
-                        
-                        conn2 = get_db_connection()
-                        if conn2:
-                            cursor2 = conn2.cursor()
-                            try:
-                                cursor2.execute(
-                                    """
-                                    INSERT INTO detections 
-                                    (camera_id, user_id, model_id, detection_type, confidence_score, timestamp, metadata) 
-                                    VALUES (%s, %s, %s, %s, %s, NOW(), %s)
-                                    """,
-                                    (camera_id, user_id, model_id, detection_type, confidence_score, json.dumps(metadata))
-                                )
-                                conn2.commit()
-                                detection_id = cursor2.lastrowid
-                                
-                                # Send real-time alert via WebSocket
-                                socketio.emit('detection_alert', {
-                                    'id': detection_id,
-                                    'camera_id': camera_id,
-                                    'camera_name': camera_data['name'],
-                                    'user_id': user_id,
-                                    'type': detection_type,
-                                    'confidence': confidence_score,
-                                    'timestamp': datetime.now().isoformat(),
-                                    'metadata': metadata
-                                }, room=f"user_{user_id}")
-                                
-                            except Error as e:
-                                conn2.rollback()
-                                print(f"Database error: {str(e)}")
-                            finally:
-                                cursor2.close()
-                                conn2.close()
+            # Every model due in this tick runs on the same decoded frame
+            models = schedule.pop_due(time.monotonic())
+            if not models:
+                continue
+            capture_stats.record_sample(entry, last_seq)
+            last_seq = entry['seq']
             
-            except Exception as e:
-                print(f"API request error for model {model_name}: {str(e)}")
-        
-        # Sleep for the specified interval
-        time.sleep(interval)
+            # Static scenes skip inference entirely, apart from periodic keep-alive samples
+            if motion_gate and not motion_gate.should_infer(preparer.crop(entry['frame'])):
+                capture_stats.record_motion_skip()
+                continue
+            
+            # Frame variants are encoded lazily, once per tick, and shared by models that ask for the same one
+            preparer.new_tick(entry['frame'])
+            
+            # Send the frame to every due AI model in parallel
+            results = dispatch_frame(models, preparer, camera_id)
+            handle_results(camera_data, results, socketio, entry['captured_at'])
+    finally:
+        grabber.remove_listener(status_listener)
+        release_grabber(grabber)
+
+def generate_frames(camera_id, camera_ip_address):
+    # Every viewer of a camera shares one RTSP session and decoder
+    grabber = acquire_grabber(camera_id, camera_ip_address)
+    last_seq = 0
     
-    cap.release()
+    try:
+        while True:
+            entry = grabber.wait_for_frame(last_seq)
+            if entry is None:
+                break
+            last_seq = entry['seq']
+            
+            # Convert to JPEG (encoded once per frame for all viewers)
+            frame_bytes = grabber.jpeg(entry)
+            
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        release_grabber(grabber)
 
-def generate_frames(camera_ip_address):
-    cap = cv2.VideoCapture(camera_ip_address)
-    if not cap.isOpened():
-        return
+class ThreadRuntime:
+    """Default camera runtime: one capture_frames thread per active camera."""
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Convert to JPEG
-        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-        frame_bytes = buffer.tobytes()
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    def __init__(self, socketio, interval=CAMERA_INTERVAL):
+        self.socketio = socketio
+        self.interval = interval
+        self._workers = {}
+        self._lock = threading.Lock()
+    
+    def add_camera(self, camera):
+        with self._lock:
+            stop_event = threading.Event()
+            camera_thread = threading.Thread(
+                target=capture_frames,
+                args=(camera['id'], camera['ip_address'], self.socketio, self.interval, stop_event),
+                daemon=True
+            )
+            camera_thread.start()
+            self._workers[camera['id']] = (camera_thread, stop_event)
+        print(f"Started camera thread for camera {camera['id']} - {camera['name']}")
+    
+    def remove_camera(self, camera_id):
+        with self._lock:
+            entry = self._workers.pop(camera_id, None)
+        if entry:
+            entry[1].set()
+    
+    def swap_source(self, camera):
+        return swap_grabber_source(camera['id'], camera['ip_address'])
 
 def start_camera_threads(socketio):
     conn = get_db_connection()
@@ -143,12 +287,20 @@ def start_camera_threads(socketio):
     cursor.close()
     conn.close()
     
-    for camera in active_cameras:
-        camera_thread = threading.Thread(
-            target=capture_frames,
-            args=(camera['id'], camera['ip_address'], socketio),
-            daemon=True
-        )
-        camera_thread.start()
-        print(f"Started camera thread for camera {camera['id']} - {camera['name']}")
-
+    # Alerts from every camera are coalesced into one message per room and tick
+    global _alert_emitter
+    _alert_emitter = BatchingEmitter(socketio)
+    
+    if CAMERA_RUNTIME == 'async':
+        # Event-loop supervisor instead of one thread per camera
+        from services.supervisor_service import start_supervisor
+        runtime = start_supervisor(_alert_emitter)
+    elif CAMERA_RUNTIME == 'processes':
+        # Cameras sharded across worker processes (each batches its own alerts)
+        from services.worker_pool import start_worker_pool
+        runtime = start_worker_pool(socketio)
+    else:
+        runtime = ThreadRuntime(_alert_emitter)
+    
+    # The registry starts the active cameras and later applies camera CRUD to the runtime
+    camera_registry.start(runtime, active_cameras)
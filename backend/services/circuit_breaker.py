@@ -0,0 +1,161 @@
+import threading
+import time
+from config import (CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, CIRCUIT_HALF_OPEN_PROBES,
+                    ADAPTIVE_INITIAL_LIMIT, ADAPTIVE_MIN_LIMIT, ADAPTIVE_MAX_LIMIT, ADAPTIVE_LATENCY_TOLERANCE)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# How quickly the no-load latency estimate follows latencies above it
+BASELINE_DRIFT = 0.01
+
+# Throttled calls are logged at most once per this many seconds and model
+THROTTLE_LOG_INTERVAL = 60
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+class ModelGuard:
+    """Circuit breaker plus an AIMD concurrency limit for one model, shared by every camera worker."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._probes = 0
+        # Adaptive limit on concurrent calls: +1 per limit's worth of fast responses, halved on slow or failed ones
+        self.limit = float(ADAPTIVE_INITIAL_LIMIT)
+        self.in_flight = 0
+        self.baseline = None
+        self.last_latency = None
+        self._next_decrease = 0.0
+        self._throttle_logged_at = None
+        self._throttled_since_log = 0
+
+    def try_acquire(self):
+        # True when a call may start now; it must then be reported with release() or cancel()
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self.opened_at < CIRCUIT_RESET_TIMEOUT:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+                print(f"Circuit for model {self.name} half-open, probing")
+
+            if self.state == HALF_OPEN:
+                if self._probes >= CIRCUIT_HALF_OPEN_PROBES:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            elif self.in_flight >= int(self.limit):
+                self.throttled += 1
+                self._log_throttled(now)
+                return False
+
+            self.in_flight += 1
+            return True
+
+    def _log_throttled(self, now):
+        # Skipped calls would otherwise go unnoticed outside /api/models/:id
+        self._throttled_since_log += 1
+        if self._throttle_logged_at is not None and now - self._throttle_logged_at < THROTTLE_LOG_INTERVAL:
+            return
+        print(f"Model {self.name} at its concurrency limit of {int(self.limit)}, "
+              f"skipped {self._throttled_since_log} calls since the last report")
+        self._throttle_logged_at = now
+        self._throttled_since_log = 0
+
+    def cancel(self):
+        # The call was never sent
+        with self._lock:
+            self.in_flight -= 1
+            if self.state == HALF_OPEN:
+                self._probes -= 1
+
+    def release(self, latency, ok):
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            self.last_latency = latency
+            if ok:
+                self._on_success(latency, now)
+            else:
+                self._on_failure(now)
+
+    def _on_success(self, latency, now):
+        self.consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            print(f"Circuit for model {self.name} closed")
+
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * BASELINE_DRIFT
+
+        if latency > self.baseline * ADAPTIVE_LATENCY_TOLERANCE:
+            self._decrease(now, latency)
+        else:
+            self.limit = min(ADAPTIVE_MAX_LIMIT, self.limit + 1 / self.limit)
+
+    def _on_failure(self, now):
+        self.consecutive_failures += 1
+        self._decrease(now, self.last_latency)
+
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD):
+            self.state = OPEN
+            self.opened_at = now
+            self.trips += 1
+            print(f"Circuit for model {self.name} opened after {self.consecutive_failures} consecutive failures")
+
+    def _decrease(self, now, latency):
+        # Responses already in flight when the limit was cut don't cut it again
+        if now < self._next_decrease:
+            return
+        self.limit = max(ADAPTIVE_MIN_LIMIT, self.limit / 2)
+        self._next_decrease = now + (latency or 0)
+
+    def stats(self):
+        with self._lock:
+            next_probe_in = None
+            if self.state == OPEN:
+                next_probe_in = round(max(0.0, CIRCUIT_RESET_TIMEOUT - (time.monotonic() - self.opened_at)), 2)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'next_probe_in': next_probe_in,
+                'rejected': self.rejected,
+                'concurrency_limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'throttled': self.throttled,
+                'baseline_latency_ms': round(self.baseline * 1000, 2) if self.baseline is not None else None,
+                'last_latency_ms': round(self.last_latency * 1000, 2) if self.last_latency is not None else None
+            }
+
+def get_guard(model):
+    with _guards_lock:
+        guard = _guards.get(model['id'])
+        if guard is None:
+            guard = ModelGuard(model['name'])
+            _guards[model['id']] = guard
+        return guard
+
+def get_guard_stats(model_id):
+    # None until the model has been called in this process
+    with _guards_lock:
+        guard = _guards.get(model_id)
+    return guard.stats() if guard else None
+
+def get_all_guard_stats():
+    with _guards_lock:
+        items = list(_guards.items())
+    return {str(model_id): guard.stats() for model_id, guard in items}
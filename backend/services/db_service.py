@@ -1,17 +1,229 @@
 
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 from werkzeug.security import generate_password_hash
-from config import DB_CONFIG
+from config import DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_AFTER, DETECTION_PARTITIONING
+from services.partition_service import (partition_clause, partition_periods, partition_horizon,
+                                        partition_detections, ensure_future_partitions)
+from services.rollup_service import create_rollup_tables, backfill_rollups
+
+class PooledConnection:
+    """Wraps a pooled MySQL connection; close() hands it back to the pool instead of disconnecting."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise PoolError("Connection already returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+    def discard(self):
+        # For a connection left with unread rows (an abandoned stream); close() would drain them first
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.abort(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for code paths that forget to close
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class ConnectionPool:
+    def __init__(self, config, size, timeout, ping_after):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'connections_aborted': 0
+        }
+
+    def get_connection(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolError(f"No database connection available after {self.timeout}s (pool size {self.size})")
+        waited = time.monotonic() - started
+
+        try:
+            connection = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            if waited > 0.001:
+                self._stats['waits'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+        return PooledConnection(self, connection)
+
+    def _checkout(self):
+        while True:
+            try:
+                connection, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                connection = mysql.connector.connect(**self.config)
+                with self._lock:
+                    self._stats['connections_created'] += 1
+                return connection
+
+            if self._is_healthy(connection, released_at):
+                return connection
+            self._discard(connection)
+
+    def _is_healthy(self, connection, released_at):
+        # Connections that sat idle may have been dropped by the server (wait_timeout, restarts)
+        if time.monotonic() - released_at < self.ping_after:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def _discard(self, connection):
+        with self._lock:
+            self._stats['connections_discarded'] += 1
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def release(self, connection):
+        try:
+            # End any open transaction so the next borrower does not read a stale snapshot
+            connection.rollback()
+            self._idle.put((connection, time.monotonic()))
+        except Error:
+            self._discard(connection)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def abort(self, connection):
+        # rollback(), and close() with the C extension, read every remaining row of an unbuffered result
+        # before returning. Killing the connection from a side connection ends the result at once.
+        try:
+            killer = mysql.connector.connect(**self.config)
+            try:
+                killer.cmd_query(f"KILL {int(connection.connection_id)}")
+            finally:
+                killer.close()
+        except Error as e:
+            print(f"Error aborting database connection: {e}")
+        try:
+            self._discard(connection)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._stats['connections_aborted'] += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            in_use = self._in_use
+        stats['avg_wait_ms'] = round(stats['wait_time_total'] / stats['checkouts'] * 1000, 2) if stats['checkouts'] else 0.0
+        stats['max_wait_ms'] = round(stats.pop('wait_time_max') * 1000, 2)
+        stats.pop('wait_time_total')
+        stats['size'] = self.size
+        stats['in_use'] = in_use
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool, _pool_pid
+    # Connections must not be shared across a fork, so each process builds its own pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_AFTER)
+            _pool_pid = os.getpid()
+        return _pool
 
 def get_db_connection():
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        return get_pool().get_connection()
     except Error as e:
         print(f"Error connecting to MySQL database: {e}")
         return None
 
+@contextmanager
+def db_connection():
+    connection = get_pool().get_connection()
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+def get_pool_stats():
+    return get_pool().stats()
+
+def add_column_if_missing(cursor, table, column, definition):
+    # CREATE TABLE IF NOT EXISTS leaves older databases untouched, so new columns are added here
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def add_index_if_missing(cursor, table, index, columns):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """,
+        (table, index)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
 def setup_database():
     try:
         conn = get_db_connection()
@@ -38,11 +250,17 @@ def setup_database():
                 location VARCHAR(100) NOT NULL,
                 ip_address VARCHAR(100) NOT NULL,
                 status ENUM('active', 'inactive') NOT NULL DEFAULT 'inactive',
+                motion_sensitivity FLOAT NULL,
+                roi JSON NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
             )
             """)
             
+            # Per-camera capture settings
+            add_column_if_missing(cursor, 'cameras', 'motion_sensitivity', "FLOAT NULL")
+            add_column_if_missing(cursor, 'cameras', 'roi', "JSON NULL")
+            
             cursor.execute("""
             CREATE TABLE IF NOT EXISTS models (
                 id INT AUTO_INCREMENT PRIMARY KEY,
@@ -50,30 +268,102 @@ def setup_database():
                 endpoint_url VARCHAR(255) NOT NULL,
                 api_key VARCHAR(255) NOT NULL,
                 description TEXT,
+                input_width INT NULL,
+                input_height INT NULL,
+                jpeg_quality TINYINT NULL,
+                color_space ENUM('bgr', 'rgb', 'gray') NOT NULL DEFAULT 'bgr',
+                timeout_seconds FLOAT NULL,
+                pool_size INT NULL,
+                batch_endpoint_url VARCHAR(255) NULL,
+                batch_size INT NULL,
+                batch_max_wait_ms INT NULL,
+                alert_cooldown_seconds FLOAT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             """)
             
+            # Frame preparation and inference settings per model
+            add_column_if_missing(cursor, 'models', 'input_width', "INT NULL")
+            add_column_if_missing(cursor, 'models', 'input_height', "INT NULL")
+            add_column_if_missing(cursor, 'models', 'jpeg_quality', "TINYINT NULL")
+            add_column_if_missing(cursor, 'models', 'color_space', "ENUM('bgr', 'rgb', 'gray') NOT NULL DEFAULT 'bgr'")
+            add_column_if_missing(cursor, 'models', 'timeout_seconds', "FLOAT NULL")
+            add_column_if_missing(cursor, 'models', 'pool_size', "INT NULL")
+            add_column_if_missing(cursor, 'models', 'batch_endpoint_url', "VARCHAR(255) NULL")
+            add_column_if_missing(cursor, 'models', 'batch_size', "INT NULL")
+            add_column_if_missing(cursor, 'models', 'batch_max_wait_ms', "INT NULL")
+            add_column_if_missing(cursor, 'models', 'alert_cooldown_seconds', "FLOAT NULL")
+            
+            # Per-camera model schedule; cameras without rows run every model at CAMERA_INTERVAL
             cursor.execute("""
-            CREATE TABLE IF NOT EXISTS detections (
+            CREATE TABLE IF NOT EXISTS camera_model_schedules (
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 camera_id INT NOT NULL,
+                model_id INT NOT NULL,
+                interval_seconds FLOAT NOT NULL,
+                enabled BOOLEAN NOT NULL DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (camera_id) REFERENCES cameras(id) ON DELETE CASCADE,
+                FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE CASCADE,
+                UNIQUE KEY uq_camera_model (camera_id, model_id)
+            )
+            """)
+            
+            # Range-partitioned by timestamp so the retention job can drop whole partitions instead of deleting rows.
+            # Partitioned tables cannot have foreign keys and every unique key must contain the timestamp.
+            if DETECTION_PARTITIONING:
+                detection_keys = "PRIMARY KEY (id, timestamp),"
+                detection_options = partition_clause(partition_periods(datetime.now(), partition_horizon()))
+            else:
+                detection_keys = """PRIMARY KEY (id),
+                FOREIGN KEY (camera_id) REFERENCES cameras(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE CASCADE,"""
+                detection_options = ""
+            
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS detections (
+                id INT AUTO_INCREMENT,
+                camera_id INT NOT NULL,
                 user_id INT NOT NULL,
                 model_id INT NOT NULL,
                 detection_type VARCHAR(50) NOT NULL,
                 confidence_score FLOAT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
                 metadata JSON,
+                ended_at TIMESTAMP NULL,
+                hit_count INT NOT NULL DEFAULT 1,
                 video_clip_path VARCHAR(255),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (camera_id) REFERENCES cameras(id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE CASCADE,
-                INDEX (camera_id),
-                INDEX (user_id)
-            )
+                {detection_keys}
+                INDEX idx_detections_time (timestamp, id),
+                INDEX idx_detections_user_time (user_id, timestamp, id),
+                INDEX idx_detections_camera_time (camera_id, timestamp, id),
+                INDEX idx_detections_model_time (model_id, timestamp, id),
+                INDEX idx_detections_type_time (detection_type, timestamp, id)
+            ) {detection_options}
             """)
             
+            # Aggregated events: last hit and number of merged hits
+            add_column_if_missing(cursor, 'detections', 'ended_at', "TIMESTAMP NULL")
+            add_column_if_missing(cursor, 'detections', 'hit_count', "INT NOT NULL DEFAULT 1")
+            
+            # Composite indexes backing the keyset-paginated detection listing
+            add_index_if_missing(cursor, 'detections', 'idx_detections_time', "timestamp, id")
+            add_index_if_missing(cursor, 'detections', 'idx_detections_user_time', "user_id, timestamp, id")
+            add_index_if_missing(cursor, 'detections', 'idx_detections_camera_time', "camera_id, timestamp, id")
+            add_index_if_missing(cursor, 'detections', 'idx_detections_model_time', "model_id, timestamp, id")
+            add_index_if_missing(cursor, 'detections', 'idx_detections_type_time', "detection_type, timestamp, id")
+            
+            # Existing tables are partitioned once; afterwards the retention job keeps partitions ahead of time
+            if DETECTION_PARTITIONING:
+                partition_detections(cursor)
+                ensure_future_partitions(cursor)
+            
+            # Per-minute/hour/day detection counts maintained by the detection writer for the dashboard
+            create_rollup_tables(cursor)
+            backfill_rollups(cursor)
+            
             cursor.execute("""
             CREATE TABLE IF NOT EXISTS audit_logs (
                 id INT AUTO_INCREMENT PRIMARY KEY,
@@ -0,0 +1,206 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from mysql.connector import Error
+from config import DETECTION_BATCH_SIZE, DETECTION_FLUSH_INTERVAL, DETECTION_QUEUE_SIZE
+from services.db_service import get_db_connection
+from services.rollup_service import write_rollups
+
+DETECTION_COLUMNS = ('camera_id', 'user_id', 'model_id', 'detection_type', 'confidence_score', 'timestamp', 'metadata')
+
+# Columns an aggregated event fills in when it closes
+UPDATE_COLUMNS = ('ended_at', 'hit_count', 'confidence_score', 'metadata')
+
+_STOP = object()
+
+class DetectionWriter:
+    """Buffers detections from every camera worker and writes them with multi-row INSERTs (and batched UPDATEs)."""
+
+    def __init__(self, batch_size, flush_interval, max_queue):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'rows_written': 0,
+            'rows_updated': 0,
+            'batches': 0,
+            'errors': 0,
+            'dropped': 0,
+            'flush_time_total': 0.0,
+            'flush_time_max': 0.0
+        }
+
+    def _ensure_started(self):
+        # The flush thread does not survive a fork, so each process starts its own (and replaces one that died)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._thread = threading.Thread(target=self._run, name='detection-writer', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _put(self, kind, payload):
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put((kind, payload, future), timeout=1)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            future.set_exception(Error("Detection queue is full"))
+        return future
+
+    def submit(self, row):
+        # Returns a Future that resolves to the detection id once its batch is committed
+        return self._put('insert', row)
+
+    def submit_update(self, detection_id, fields):
+        # fields holds UPDATE_COLUMNS, plus an optional 'rollup' correction for the dashboard rollups;
+        # the Future resolves to detection_id once committed
+        return self._put('update', (detection_id, fields))
+
+    def stop(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put((_STOP, None, None))
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item[0] is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item[0] is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # Anything unexpected fails this batch only; the thread keeps serving the queue
+                print(f"Unexpected error while writing detections: {str(e)}")
+                self._fail(batch, e)
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        conn = get_db_connection()
+        if not conn:
+            self._fail(batch, Error("Database connection error"))
+            return
+
+        inserts = [(row, future) for kind, row, future in batch if kind == 'insert']
+        updates = [(update, future) for kind, update, future in batch if kind == 'update']
+
+        # Dashboard rollups are maintained in the same transaction as the rows they count
+        rollups = [(row, 1, 1, row['confidence_score'], row['confidence_score']) for row, _ in inserts]
+        rollups += [
+            (fields['rollup']['row'], 0, fields['rollup']['hits'], fields['rollup']['confidence_delta'], fields['confidence_score'])
+            for (_, fields), _ in updates if fields.get('rollup')
+        ]
+
+        cursor = conn.cursor()
+        try:
+            if inserts:
+                # Ids of a multi-row INSERT are spaced by the server's auto_increment_increment
+                cursor.execute("SELECT @@SESSION.auto_increment_increment")
+                increment = cursor.fetchone()[0]
+                placeholders = ", ".join(["(" + ", ".join(["%s"] * len(DETECTION_COLUMNS)) + ")"] * len(inserts))
+                params = []
+                for row, _ in inserts:
+                    params.extend([
+                        row['camera_id'],
+                        row['user_id'],
+                        row['model_id'],
+                        row['detection_type'],
+                        row['confidence_score'],
+                        row['timestamp'],
+                        json.dumps(row.get('metadata', {}))
+                    ])
+
+                cursor.execute(
+                    f"INSERT INTO detections ({', '.join(DETECTION_COLUMNS)}) VALUES {placeholders}",
+                    params
+                )
+                # A multi-row INSERT reports the first AUTO_INCREMENT id. InnoDB reserves every id of a simple
+                # INSERT with a known row count at once, so the rest follow it one increment apart
+                first_id = cursor.lastrowid
+                if cursor.rowcount != len(inserts):
+                    raise Error(f"Inserted {cursor.rowcount} of {len(inserts)} detections")
+
+            if updates:
+                cursor.executemany(
+                    f"UPDATE detections SET {', '.join(f'{column} = %s' for column in UPDATE_COLUMNS)} WHERE id = %s",
+                    [
+                        (fields['ended_at'], fields['hit_count'], fields['confidence_score'],
+                         json.dumps(fields.get('metadata', {})), detection_id)
+                        for (detection_id, fields), _ in updates
+                    ]
+                )
+            write_rollups(cursor, rollups)
+            conn.commit()
+
+            for index, (_, future) in enumerate(inserts):
+                future.set_result(first_id + index * increment)
+            for (detection_id, _), future in updates:
+                future.set_result(detection_id)
+
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._stats['rows_written'] += len(inserts)
+                self._stats['rows_updated'] += len(updates)
+                self._stats['batches'] += 1
+                self._stats['flush_time_total'] += elapsed
+                self._stats['flush_time_max'] = max(self._stats['flush_time_max'], elapsed)
+
+        except Exception as e:
+            conn.rollback()
+            print(f"Database error while writing detections: {str(e)}")
+            self._fail(batch, e)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _fail(self, batch, error):
+        with self._lock:
+            self._stats['errors'] += 1
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        flush_time_total = stats.pop('flush_time_total')
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_size'] = round((stats['rows_written'] + stats['rows_updated']) / batches, 2) if batches else 0.0
+        stats['avg_flush_ms'] = round(flush_time_total / batches * 1000, 2) if batches else 0.0
+        stats['max_flush_ms'] = round(stats.pop('flush_time_max') * 1000, 2)
+        return stats
+
+detection_writer = DetectionWriter(DETECTION_BATCH_SIZE, DETECTION_FLUSH_INTERVAL, DETECTION_QUEUE_SIZE)
+
+# Commit whatever is still buffered when the process exits
+atexit.register(detection_writer.stop)
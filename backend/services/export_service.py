@@ -0,0 +1,154 @@
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from datetime import datetime
+from config import EXPORT_CHUNK_SIZE, EXPORT_GZIP_LEVEL
+
+# Columns of an export, in order; the export query selects exactly these
+EXPORT_COLUMNS = ('id', 'timestamp', 'ended_at', 'camera_id', 'camera_name', 'user_id', 'model_id',
+                  'detection_type', 'confidence_score', 'hit_count', 'metadata', 'video_clip_path')
+
+# Format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+def iter_chunks(cursor, chunk_size=EXPORT_CHUNK_SIZE):
+    # Works with any DB-API cursor; on an unbuffered MySQL cursor only one chunk is held at a time
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
+
+def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows([_text(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def encode_ndjson(chunks):
+    metadata = EXPORT_COLUMNS.index('metadata')
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            values = [_text(value) for value in row]
+            if isinstance(values[metadata], str):
+                try:
+                    values[metadata] = json.loads(values[metadata])
+                except ValueError:
+                    values[metadata] = {}
+            lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, values))) + '\n')
+        yield ''.join(lines).encode()
+
+class _ChunkSink:
+    """Write-only file object that hands Parquet bytes to the response as soon as they are written."""
+
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ('id', pa.int32()),
+        ('timestamp', pa.timestamp('s')),
+        ('ended_at', pa.timestamp('s')),
+        ('camera_id', pa.int32()),
+        ('camera_name', pa.string()),
+        ('user_id', pa.int32()),
+        ('model_id', pa.int32()),
+        ('detection_type', pa.string()),
+        ('confidence_score', pa.float32()),
+        ('hit_count', pa.int32()),
+        ('metadata', pa.string()),
+        ('video_clip_path', pa.string())
+    ])
+
+def parquet_available():
+    # Checked before the response starts; a failed import inside the stream would cut it off mid-body
+    return importlib.util.find_spec('pyarrow') is not None
+
+def encode_parquet(chunks):
+    # Optional dependency: pip install pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+
+    # Each chunk becomes one row group, so the footer is the only part that waits for the end
+    metadata = EXPORT_COLUMNS.index('metadata')
+    for rows in chunks:
+        columns = [list(column) for column in zip(*rows)]
+        columns[metadata] = [_text(value) for value in columns[metadata]]
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.drain()
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson, 'parquet': encode_parquet}
+
+def gzip_stream(body, level=EXPORT_GZIP_LEVEL):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in body:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_chunks(chunks, fmt, compress=False):
+    body = ENCODERS[fmt](chunks)
+    return gzip_stream(body) if compress else body
+
+def export_filename(fmt, compress=False, now=None):
+    filename = f"detections_{(now or datetime.now()):%Y%m%dT%H%M%S}.{EXPORT_FORMATS[fmt][1]}"
+    return filename + '.gz' if compress else filename
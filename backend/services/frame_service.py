@@ -0,0 +1,169 @@
+import copy
+import json
+import threading
+import cv2
+from services.result_cache import dhash
+
+DEFAULT_JPEG_QUALITY = 80
+# JPEG carries no channel order: color frames are always encoded from OpenCV's BGR and decode as regular RGB
+# images, so models that want BGR arrays convert after decoding. Rows still set to 'rgb' encode as 'bgr'.
+COLOR_SPACES = ('bgr', 'gray')
+
+def variant_key(model):
+    # Models that share the same size/quality/color settings share one encoded buffer
+    width = model.get('input_width') or None
+    height = model.get('input_height') or None
+    quality = model.get('jpeg_quality') or DEFAULT_JPEG_QUALITY
+    color_space = (model.get('color_space') or 'bgr').lower()
+    if color_space not in COLOR_SPACES:
+        color_space = 'bgr'
+    return (width, height, int(quality), color_space)
+
+def parse_roi(value):
+    # Camera region of interest as fractions of the frame: {"x", "y", "width", "height"}; None for the full frame
+    if isinstance(value, (str, bytes)):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    if not isinstance(value, dict):
+        return None
+    try:
+        x, y = float(value.get('x', 0)), float(value.get('y', 0))
+        width, height = float(value['width']), float(value['height'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > 1 or y + height > 1:
+        return None
+    return (x, y, width, height)
+
+def roi_bounds(frame, roi):
+    # Pixel rectangle (left, top, right, bottom) of the region of interest
+    frame_height, frame_width = frame.shape[:2]
+    if roi is None:
+        return 0, 0, frame_width, frame_height
+    x, y, width, height = roi
+    left, top = int(x * frame_width), int(y * frame_height)
+    right = max(left + 1, min(frame_width, round((x + width) * frame_width)))
+    bottom = max(top + 1, min(frame_height, round((y + height) * frame_height)))
+    return left, top, right, bottom
+
+def _map_boxes(value, geometry):
+    left, top, scale_x, scale_y = geometry
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == 'bounding_box' and isinstance(item, list) and len(item) == 4:
+                x, y, width, height = item
+                value[key] = [
+                    round(x * scale_x + left), round(y * scale_y + top),
+                    round(width * scale_x), round(height * scale_y)
+                ]
+            else:
+                _map_boxes(item, geometry)
+    elif isinstance(value, list):
+        for item in value:
+            _map_boxes(item, geometry)
+
+def _target_size(frame, width, height):
+    frame_height, frame_width = frame.shape[:2]
+    if width and height:
+        return int(width), int(height)
+    if width:
+        return int(width), max(1, round(frame_height * width / frame_width))
+    if height:
+        return max(1, round(frame_width * height / frame_height)), int(height)
+    return frame_width, frame_height
+
+def encode_variant(frame, key):
+    width, height, quality, color_space = key
+
+    target_width, target_height = _target_size(frame, width, height)
+    if (target_width, target_height) != (frame.shape[1], frame.shape[0]):
+        frame = cv2.resize(frame, (target_width, target_height), interpolation=cv2.INTER_AREA)
+
+    if color_space == 'gray':
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None
+
+    # memoryview over the encoder's output so every model posts the same bytes without a copy
+    return memoryview(buffer)
+
+class FramePreparer:
+    """Per-camera preparation stage: crops to the camera's region of interest and encodes each variant at most once per tick."""
+
+    def __init__(self, roi=None):
+        self.roi = roi
+        self._lock = threading.Lock()
+        self._frame = None
+        self._origin = (0, 0)
+        self._variants = {}
+        self._hash = None
+        self.ticks = 0
+        self.encodes = 0
+        self.requests = 0
+        self.bytes_encoded = 0
+
+    def crop(self, frame):
+        # View of the region of interest (no copy)
+        left, top, right, bottom = roi_bounds(frame, self.roi)
+        return frame[top:bottom, left:right]
+
+    def new_tick(self, frame):
+        left, top, _, _ = roi_bounds(frame, self.roi)
+        with self._lock:
+            self._frame = self.crop(frame)
+            self._origin = (left, top)
+            self._variants = {}
+            self._hash = None
+            self.ticks += 1
+
+    def frame_hash(self):
+        # Perceptual hash of the current frame, computed at most once per tick
+        with self._lock:
+            if self._hash is None and self._frame is not None:
+                self._hash = dhash(self._frame)
+            return self._hash
+
+    def get(self, model):
+        key = variant_key(model)
+        with self._lock:
+            self.requests += 1
+            buffer = self._variants.get(key)
+            if buffer is None and self._frame is not None:
+                buffer = encode_variant(self._frame, key)
+                self._variants[key] = buffer
+                self.encodes += 1
+                if buffer is not None:
+                    self.bytes_encoded += buffer.nbytes
+            return buffer
+
+    def to_frame_coordinates(self, model, detection_data):
+        # Map bounding boxes from the model's input image back to the full camera frame
+        width, height = variant_key(model)[:2]
+        with self._lock:
+            if self._frame is None:
+                return detection_data
+            crop_height, crop_width = self._frame.shape[:2]
+            target_width, target_height = _target_size(self._frame, width, height)
+            geometry = self._origin + (crop_width / target_width, crop_height / target_height)
+
+        if geometry == (0, 0, 1.0, 1.0) or not isinstance(detection_data, dict):
+            return detection_data
+        # Responses may be shared through the result cache, so map a copy
+        mapped = copy.deepcopy(detection_data)
+        _map_boxes(mapped.get('metadata'), geometry)
+        return mapped
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ticks': self.ticks,
+                'encodes': self.encodes,
+                'requests': self.requests,
+                'variants_in_tick': len(self._variants),
+                'bytes_encoded': self.bytes_encoded,
+                'avg_bytes_per_encode': round(self.bytes_encoded / self.encodes) if self.encodes else 0
+            }
@@ -0,0 +1,297 @@
+import random
+import threading
+import time
+from collections import deque
+import cv2
+from config import (GRABBER_BUFFER_SIZE, RTSP_RECONNECT_BASE_DELAY, RTSP_RECONNECT_MAX_DELAY,
+                    RTSP_RECONNECT_MAX_ATTEMPTS, RTSP_MAX_CONCURRENT_CONNECTS)
+
+_grabbers = {}
+_grabbers_lock = threading.Lock()
+
+# Bounds simultaneous RTSP opens, so cameras behind a switch that comes back up don't all connect at once
+_connect_slots = threading.BoundedSemaphore(RTSP_MAX_CONCURRENT_CONNECTS)
+
+def backoff_delay(attempt):
+    # Full jitter: anywhere between 0 and the capped exponential delay, which spreads out cameras that failed together
+    ceiling = min(RTSP_RECONNECT_MAX_DELAY, RTSP_RECONNECT_BASE_DELAY * 2 ** min(attempt, 30))
+    return random.uniform(0, ceiling)
+
+class FrameGrabber:
+    """Decodes one camera stream once and shares the frames with every subscriber."""
+
+    def __init__(self, camera_id, rtsp_url, buffer_size, external=False):
+        self.camera_id = camera_id
+        self.rtsp_url = rtsp_url
+        # External grabbers are read by their owner (the async supervisor) instead of a thread
+        self.external = external
+        self.refs = 0
+        self.stopped = False
+        self._cap = None
+        self._pending_url = None
+        self._frames = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._encode_lock = threading.Lock()
+        self._thread = None
+        self._started_at = time.monotonic()
+        # Connection state machine: connecting -> streaming -> reconnecting -> ... -> failed
+        self.state = 'connecting'
+        self.attempts = 0
+        self.reconnects = 0
+        self.last_error = None
+        self._listeners = []
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"grabber-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+    def add_listener(self, listener):
+        # listener(camera_id, status) is called on every state transition
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _set_state(self, state, **details):
+        with self._cond:
+            self.state = state
+            listeners = list(self._listeners)
+
+        status = {'state': state}
+        status.update(details)
+        for listener in listeners:
+            try:
+                listener(self.camera_id, status)
+            except Exception as e:
+                print(f"Error reporting state of camera {self.camera_id}: {str(e)}")
+
+    def open(self):
+        self._cap = cv2.VideoCapture(self.rtsp_url)
+        if not self._cap.isOpened():
+            print(f"Error opening RTSP stream: {self.rtsp_url}")
+            self.disconnect()
+            return False
+
+        # Keep OpenCV's own queue minimal; the reader drains the stream continuously anyway
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return True
+
+    def connect(self):
+        # One connection attempt; on failure the reader backs off and tries again
+        with self._cond:
+            if self._pending_url:
+                # A source swapped while disconnected is simply used for the next attempt
+                self.rtsp_url, self._pending_url = self._pending_url, None
+        self._set_state('connecting', attempt=self.attempts + 1)
+
+        with _connect_slots:
+            if self.stopped:
+                return False
+            opened = self.open()
+
+        if not opened:
+            self.attempts += 1
+            self.last_error = f"Could not open {self.rtsp_url}"
+            return False
+
+        if self.attempts or self._seq:
+            self.reconnects += 1
+        self.attempts = 0
+        self._set_state('streaming')
+        return True
+
+    def next_backoff(self):
+        # Seconds to wait before the next attempt. Past the reconnect budget the camera is reported failed but
+        # still retried at the maximum delay, so its worker keeps running and picks the stream up when it returns.
+        if RTSP_RECONNECT_MAX_ATTEMPTS and self.attempts >= RTSP_RECONNECT_MAX_ATTEMPTS:
+            if self.attempts == RTSP_RECONNECT_MAX_ATTEMPTS:
+                print(f"Camera {self.camera_id} failed after {self.attempts} reconnect attempts, "
+                      f"retrying every {RTSP_RECONNECT_MAX_DELAY:g}s")
+            delay = random.uniform(RTSP_RECONNECT_MAX_DELAY / 2, RTSP_RECONNECT_MAX_DELAY)
+            self._set_state('failed', attempts=self.attempts, retry_in=round(delay, 2), error=self.last_error)
+            return delay
+
+        delay = backoff_delay(self.attempts)
+        self._set_state('reconnecting', attempts=self.attempts, retry_in=round(delay, 2), error=self.last_error)
+        return delay
+
+    def wait_stopped(self, timeout):
+        # Backoff sleep that ends early when the grabber is stopped; True if it was
+        with self._cond:
+            return self._cond.wait_for(lambda: self.stopped, timeout)
+
+    def disconnect(self):
+        # Drop the RTSP session but keep the grabber (and its subscribers) alive
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def swap_source(self, rtsp_url):
+        # Applied by the reader between frames, so subscribers keep their stream
+        with self._cond:
+            self._pending_url = rtsp_url
+
+    def _apply_pending_source(self):
+        with self._cond:
+            rtsp_url, self._pending_url = self._pending_url, None
+
+        cap = cv2.VideoCapture(rtsp_url)
+        if not cap.isOpened():
+            print(f"Error opening RTSP stream: {rtsp_url}, keeping {self.rtsp_url}")
+            cap.release()
+            return
+
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        previous, self._cap = self._cap, cap
+        self.rtsp_url = rtsp_url
+        previous.release()
+        print(f"Camera {self.camera_id} switched to {rtsp_url}")
+
+    def read_once(self):
+        if self._pending_url:
+            self._apply_pending_source()
+
+        ret, frame = self._cap.read()
+        if not ret:
+            print(f"Error reading frame from camera {self.camera_id}")
+            self.last_error = 'Stream dropped'
+            self.disconnect()
+            return False
+
+        with self._cond:
+            self._seq += 1
+            self._frames.append({
+                'seq': self._seq,
+                'captured_at': time.time(),
+                'frame': frame,
+                'jpeg': None
+            })
+            self._cond.notify_all()
+        return True
+
+    def close(self):
+        self.disconnect()
+        self.stop()
+
+    def _run(self):
+        try:
+            # A grabber handed over from an external reader keeps its open capture
+            connected = self._cap is not None or self.connect()
+            while not self.stopped:
+                if connected and self.read_once():
+                    continue
+                # Dropped or never connected: back off, then retry
+                if self.wait_stopped(self.next_backoff()):
+                    return
+                connected = self.connect()
+        finally:
+            self.close()
+
+    def latest(self):
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        # Newest buffered frame with a sequence number above after_seq; None once the grabber stops
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while not self.stopped and (not self._frames or self._frames[-1]['seq'] <= after_seq):
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self.stopped or not self._frames:
+                return None
+            return self._frames[-1]
+
+    def jpeg(self, entry, quality=70):
+        # MJPEG viewers share one encoding per frame
+        with self._encode_lock:
+            if entry['jpeg'] is None:
+                _, buffer = cv2.imencode('.jpg', entry['frame'], [cv2.IMWRITE_JPEG_QUALITY, quality])
+                entry['jpeg'] = buffer.tobytes()
+            return entry['jpeg']
+
+    def stats(self):
+        with self._cond:
+            uptime = time.monotonic() - self._started_at
+            return {
+                'subscribers': self.refs,
+                'frames_decoded': self._seq,
+                'buffered_frames': len(self._frames),
+                'fps': round(self._seq / uptime, 2) if uptime else 0.0,
+                'running': not self.stopped,
+                'state': self.state,
+                'reconnect_attempts': self.attempts,
+                'reconnects': self.reconnects,
+                'last_error': self.last_error
+            }
+
+def acquire_grabber(camera_id, rtsp_url, external=False):
+    with _grabbers_lock:
+        grabber = _grabbers.get(camera_id)
+        if grabber is None or grabber.stopped:
+            grabber = FrameGrabber(camera_id, rtsp_url, GRABBER_BUFFER_SIZE, external)
+            _grabbers[camera_id] = grabber
+            if not external:
+                grabber.start()
+        elif grabber.rtsp_url != rtsp_url:
+            # One session per camera: a subscriber that already sees a new URL moves the shared grabber over
+            grabber.swap_source(rtsp_url)
+        grabber.refs += 1
+        return grabber
+
+def retain_grabber(camera_id):
+    # Extra reference on a running grabber (None if there is none), e.g. to keep it open across a restart
+    with _grabbers_lock:
+        grabber = _grabbers.get(camera_id)
+        if grabber is None or grabber.stopped:
+            return None
+        grabber.refs += 1
+        return grabber
+
+def swap_grabber_source(camera_id, rtsp_url):
+    # True if the camera's grabber switches to rtsp_url between frames. A grabber that is not streaming may sit in
+    # a backoff or have given up, so it is stopped instead and the caller restarts the camera on a fresh one.
+    with _grabbers_lock:
+        grabber = _grabbers.get(camera_id)
+        if grabber is None or grabber.stopped:
+            return False
+        if grabber.state != 'streaming':
+            grabber.stop()
+            del _grabbers[camera_id]
+            return False
+    if grabber.rtsp_url != rtsp_url:
+        grabber.swap_source(rtsp_url)
+    return True
+
+def release_grabber(grabber, reader=False):
+    # reader=True when the external reader itself lets go (it must have stopped reading first)
+    with _grabbers_lock:
+        grabber.refs -= 1
+        if grabber.refs <= 0:
+            # Last subscriber gone: stop decoding and close the RTSP session
+            if grabber.external:
+                grabber.close()
+            else:
+                grabber.stop()
+            if _grabbers.get(grabber.camera_id) is grabber:
+                del _grabbers[grabber.camera_id]
+        elif reader and grabber.external and not grabber.stopped:
+            # Viewers remain, so a thread takes over reading the open capture
+            grabber.external = False
+            grabber.start()
+
+def get_grabber_stats():
+    with _grabbers_lock:
+        grabbers = list(_grabbers.values())
+    return {str(grabber.camera_id): grabber.stats() for grabber in grabbers}
@@ -0,0 +1,105 @@
+import threading
+import time
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import HTTP_POOL_SIZE
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class EndpointStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.connect_time_total = 0.0
+        self.connect_time_max = 0.0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connect(self, seconds):
+        with self._lock:
+            self.connections += 1
+            self.connect_time_total += seconds
+            self.connect_time_max = max(self.connect_time_max, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            reused = max(0, self.requests - self.connections)
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections,
+                'connections_reused': reused,
+                'reuse_ratio': round(reused / self.requests, 4) if self.requests else 0.0,
+                'avg_handshake_ms': round(self.connect_time_total / self.connections * 1000, 2) if self.connections else 0.0,
+                'max_handshake_ms': round(self.connect_time_max * 1000, 2)
+            }
+
+def _timed_connection_class(base, stats):
+    # connect() covers the TCP connect and, for HTTPS, the TLS handshake
+    class TimedConnection(base):
+        def connect(self):
+            started = time.monotonic()
+            super().connect()
+            stats.record_connect(time.monotonic() - started)
+    return TimedConnection
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, stats, pool_size):
+        self.stats = stats
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('TimedHTTPConnectionPool', (HTTPConnectionPool,), {
+                'ConnectionCls': _timed_connection_class(HTTPConnection, self.stats)
+            }),
+            'https': type('TimedHTTPSConnectionPool', (HTTPSConnectionPool,), {
+                'ConnectionCls': _timed_connection_class(HTTPSConnection, self.stats)
+            })
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+def endpoint_origin(endpoint_url):
+    parts = urlsplit(endpoint_url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def get_session(model):
+    # One keep-alive session per (origin, pool size), shared by every camera worker
+    origin = endpoint_origin(model['endpoint_url'])
+    pool_size = int(model.get('pool_size') or HTTP_POOL_SIZE)
+    key = (origin, pool_size)
+
+    with _sessions_lock:
+        entry = _sessions.get(key)
+        if entry is None:
+            stats = EndpointStats()
+            session = requests.Session()
+            session.mount(origin, PooledAdapter(stats, pool_size))
+            entry = (session, stats)
+            _sessions[key] = entry
+        return entry[0]
+
+def get_http_stats(endpoint_url=None):
+    origin = endpoint_origin(endpoint_url) if endpoint_url else None
+    with _sessions_lock:
+        entries = list(_sessions.items())
+
+    stats = []
+    for (entry_origin, pool_size), (_, entry_stats) in entries:
+        if origin and entry_origin != origin:
+            continue
+        data = entry_stats.as_dict()
+        data['origin'] = entry_origin
+        data['pool_size'] = pool_size
+        stats.append(data)
+    return stats
@@ -0,0 +1,245 @@
+import queue
+import threading
+import time
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from config import (AI_MODEL_KEYS, INFERENCE_MAX_WORKERS, INFERENCE_MAX_IN_FLIGHT, INFERENCE_TIMEOUT,
+                    INFERENCE_BATCH_SIZE, INFERENCE_BATCH_MAX_WAIT_MS)
+from services.circuit_breaker import get_guard
+from services.http_service import get_session
+from services.result_cache import result_cache
+
+# Shared by every camera worker so the total number of outstanding model calls stays bounded
+_executor = ThreadPoolExecutor(max_workers=INFERENCE_MAX_WORKERS, thread_name_prefix='inference')
+_in_flight = threading.BoundedSemaphore(INFERENCE_MAX_IN_FLIGHT)
+
+# Per-model micro-batchers, and models whose batch endpoint turned out not to exist: id -> (endpoint, when)
+_batchers = {}
+_batchers_lock = threading.Lock()
+_batch_unsupported = {}
+BATCH_UNSUPPORTED_STATUSES = (404, 405, 415, 501)
+
+# An endpoint without batch support is tried again after this many seconds, e.g. once the model server is upgraded
+BATCH_RETRY_INTERVAL = 600
+
+def model_timeout(model):
+    return float(model.get('timeout_seconds') or INFERENCE_TIMEOUT)
+
+def run_inference(model, buffer):
+    files = {'image': ('image.jpg', buffer, 'image/jpeg')}
+    headers = {
+        'Authorization': f"Bearer {AI_MODEL_KEYS.get(model['name'], '')}"
+    }
+
+    response = get_session(model).post(model['endpoint_url'], files=files, headers=headers, timeout=model_timeout(model))
+    if response.status_code == 200:
+        return response.json()
+
+    # Server errors count against the model's circuit breaker
+    if response.status_code >= 500:
+        response.raise_for_status()
+
+    print(f"Model {model['name']} returned HTTP {response.status_code}")
+    return None
+
+def batching_enabled(model):
+    if not model.get('batch_endpoint_url'):
+        return False
+    unsupported = _batch_unsupported.get(model['id'])
+    return (unsupported is None or unsupported[0] != model['batch_endpoint_url']
+            or time.monotonic() - unsupported[1] >= BATCH_RETRY_INTERVAL)
+
+def forget_batch_support(model_id):
+    # An edited model gets its batch endpoint tried again right away
+    _batch_unsupported.pop(model_id, None)
+
+def run_batch_inference(model, buffers):
+    files = [('images', (f"frame_{index}.jpg", buffer, 'image/jpeg')) for index, buffer in enumerate(buffers)]
+    headers = {
+        'Authorization': f"Bearer {AI_MODEL_KEYS.get(model['name'], '')}"
+    }
+
+    response = get_session({**model, 'endpoint_url': model['batch_endpoint_url']}).post(
+        model['batch_endpoint_url'], files=files, headers=headers, timeout=model_timeout(model)
+    )
+    if response.status_code in BATCH_UNSUPPORTED_STATUSES:
+        return None
+
+    response.raise_for_status()
+    data = response.json()
+    results = data.get('results') if isinstance(data, dict) else data
+    if not isinstance(results, list) or len(results) != len(buffers):
+        raise ValueError(f"Batch response from {model['name']} does not match the {len(buffers)} submitted frames")
+    return results
+
+class ModelBatcher:
+    """Collects frames for one model from many cameras and sends them as one multipart request."""
+
+    def __init__(self, model):
+        self.configure(model)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{model['name']}", daemon=True)
+        self._thread.start()
+
+    def configure(self, model):
+        # Edited batch settings apply from the next batch on
+        self.model = model
+        self.batch_size = int(model.get('batch_size') or INFERENCE_BATCH_SIZE)
+        self.max_wait = (model.get('batch_max_wait_ms') or INFERENCE_BATCH_MAX_WAIT_MS) / 1000.0
+
+    def submit(self, buffer):
+        future = Future()
+        self._queue.put((buffer, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            _executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        model = self.model
+        try:
+            if not batching_enabled(model):
+                results = None
+            else:
+                results = run_batch_inference(model, [buffer for buffer, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if results is None:
+            # Endpoint has no batch support: remember that and fall back to one request per frame
+            if batching_enabled(model):
+                print(f"Model {model['name']} does not support batching, falling back to single requests")
+                _batch_unsupported[model['id']] = (model['batch_endpoint_url'], time.monotonic())
+            # Sent in parallel, and each frame gets its own result or error, as if it had not been batched
+            for buffer, future in batch:
+                _executor.submit(run_inference, model, buffer).add_done_callback(partial(_copy_outcome, future))
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+def _copy_outcome(future, done):
+    try:
+        future.set_result(done.result())
+    except Exception as e:
+        future.set_exception(e)
+
+BATCH_SETTINGS = ('batch_endpoint_url', 'batch_size', 'batch_max_wait_ms')
+
+def get_batcher(model):
+    with _batchers_lock:
+        batcher = _batchers.get(model['id'])
+        if batcher is None:
+            batcher = ModelBatcher(model)
+            _batchers[model['id']] = batcher
+        elif any(batcher.model.get(field) != model.get(field) for field in BATCH_SETTINGS):
+            batcher.configure(model)
+        return batcher
+
+def _record_outcome(guard, started, future):
+    _in_flight.release()
+    ok = not future.cancelled() and future.exception() is None
+    guard.release(time.monotonic() - started, ok)
+
+def submit_frame(models, preparer, camera_id=None):
+    # Start inference of the current frame on every model; returns (cached results, futures, frame hash)
+    results = []
+    futures = {}
+    frame_hash = preparer.frame_hash() if result_cache else None
+
+    for model in models:
+        # Near-identical frames reuse the model's previous response instead of a paid remote call
+        if result_cache:
+            cached = result_cache.get(camera_id, model['id'], frame_hash)
+            if cached is not None:
+                results.append((model, cached))
+                continue
+
+        # Open circuit or model at its adaptive concurrency limit: skip it this tick, before encoding anything
+        guard = get_guard(model)
+        if not guard.try_acquire():
+            continue
+
+        # One model's bad frame settings must not stop the camera's other models
+        try:
+            buffer = preparer.get(model)
+        except Exception as e:
+            guard.cancel()
+            print(f"Error encoding frame for model {model['name']}: {str(e)}")
+            continue
+        if buffer is None:
+            guard.cancel()
+            print(f"Error encoding frame for model {model['name']}")
+            continue
+
+        if not _in_flight.acquire(timeout=model_timeout(model)):
+            guard.cancel()
+            print(f"Inference in-flight limit reached, skipping model {model['name']}")
+            continue
+
+        started = time.monotonic()
+        try:
+            if batching_enabled(model):
+                future = get_batcher(model).submit(buffer)
+            else:
+                future = _executor.submit(run_inference, model, buffer)
+        except RuntimeError:
+            _in_flight.release()
+            guard.cancel()
+            raise
+        future.add_done_callback(partial(_record_outcome, guard, started))
+        futures[future] = model
+
+    return results, futures, frame_hash
+
+def wait_timeout(futures):
+    # The tick takes as long as the slowest model, bounded by the largest per-model timeout
+    return max(model_timeout(model) for model in futures.values()) + 1
+
+def valid_detection(detection_data):
+    # A response object whose confidence_score, when present, is a number
+    if not isinstance(detection_data, dict):
+        return False
+    confidence = detection_data.get('confidence_score', 0)
+    return isinstance(confidence, (int, float)) and not isinstance(confidence, bool)
+
+def collect_results(results, futures, frame_hash, preparer, camera_id=None):
+    for future, model in futures.items():
+        if not future.done():
+            print(f"API request timeout for model {model['name']}")
+            continue
+        try:
+            detection_data = future.result()
+        except Exception as e:
+            print(f"API request error for model {model['name']}: {str(e)}")
+            continue
+        if detection_data is not None and not valid_detection(detection_data):
+            print(f"Invalid response from model {model['name']}: {str(detection_data)[:200]}")
+            continue
+        if detection_data is not None:
+            if result_cache:
+                result_cache.put(camera_id, model['id'], frame_hash, detection_data)
+            results.append((model, detection_data))
+
+    # Models saw a cropped and resized image; alerts and stored rows use full-frame coordinates
+    return [(model, preparer.to_frame_coordinates(model, detection_data)) for model, detection_data in results]
+
+def dispatch_frame(models, preparer, camera_id=None):
+    # Send the current frame to every model in parallel; returns [(model, detection_data), ...]
+    results, futures, frame_hash = submit_frame(models, preparer, camera_id)
+    if futures:
+        wait(futures, timeout=wait_timeout(futures))
+    return collect_results(results, futures, frame_hash, preparer, camera_id)
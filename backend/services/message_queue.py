@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from multiprocessing.connection import Client, Listener, wait
+from urllib.parse import urlsplit
+import socketio
+from config import SOCKETIO_MESSAGE_QUEUE, SOCKETIO_ASYNC_MODE, SOCKETIO_BROKER_AUTHKEY
+
+LOCAL_SCHEME = 'local'
+
+# The placeholder shipped in config.py and .env.example, which must never guard a real broker
+DEFAULT_BROKER_AUTHKEY = 'your-broker-key'
+
+def broker_authkey():
+    # Anyone holding the key can publish to every server process, so refuse to run without a private one
+    if not SOCKETIO_BROKER_AUTHKEY or SOCKETIO_BROKER_AUTHKEY == DEFAULT_BROKER_AUTHKEY:
+        raise ValueError("SOCKETIO_BROKER_AUTHKEY must be set to a private value to use a local:// message queue")
+    return SOCKETIO_BROKER_AUTHKEY.encode()
+
+def _broker_address(url):
+    parts = urlsplit(url)
+    return (parts.hostname or '127.0.0.1', parts.port or 5055)
+
+class LocalBrokerManager(socketio.PubSubManager):
+    """Socket.IO client manager backed by the local broker below, for deployments without Redis/AMQP."""
+
+    name = 'local'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None):
+        self.address = _broker_address(url)
+        self.authkey = broker_authkey()
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _connect(self, role):
+        conn = Client(self.address, authkey=self.authkey)
+        conn.send_bytes(f"{role}:{self.channel}".encode())
+        return conn
+
+    def _publish(self, data):
+        # JSON rather than pickle, so a message can never run code in the receiving process;
+        # Socket.IO payloads have to be JSON for the browser anyway
+        payload = json.dumps(data).encode()
+        with self._publish_lock:
+            # One reconnect attempt if the broker restarted since the last publish
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect('pub')
+                    self._publisher.send_bytes(payload)
+                    return
+                except (OSError, EOFError) as e:
+                    self._publisher = None
+                    if attempt:
+                        self._get_logger().error(f"Socket.IO broker publish failed: {str(e)}")
+
+    def _listen(self):
+        while True:
+            try:
+                conn = self._connect('sub')
+                while True:
+                    yield json.loads(conn.recv_bytes())
+            except (OSError, EOFError) as e:
+                self._get_logger().error(f"Socket.IO broker connection lost: {str(e)}, retrying")
+                time.sleep(1)
+
+def run_broker(url):
+    # Fans every published message out to the subscribers of its channel
+    listener = Listener(_broker_address(url), authkey=broker_authkey())
+    publishers = {}
+    subscribers = {}
+    lock = threading.Lock()
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+                role, channel = conn.recv_bytes().decode().split(':', 1)
+            except (OSError, EOFError, ValueError) as e:
+                print(f"Rejected broker connection: {str(e)}")
+                continue
+            with lock:
+                if role == 'sub':
+                    subscribers.setdefault(channel, []).append(conn)
+                else:
+                    publishers[conn] = channel
+
+    threading.Thread(target=accept, name='broker-accept', daemon=True).start()
+    print(f"Socket.IO broker listening on {listener.address}")
+
+    while True:
+        with lock:
+            channels = dict(publishers)
+        if not channels:
+            time.sleep(0.5)
+            continue
+
+        for conn in wait(list(channels), timeout=0.5):
+            channel = channels[conn]
+            try:
+                message = conn.recv_bytes()
+            except (OSError, EOFError):
+                with lock:
+                    publishers.pop(conn, None)
+                continue
+
+            with lock:
+                targets = list(subscribers.get(channel, ()))
+            for subscriber in targets:
+                try:
+                    subscriber.send_bytes(message)
+                except (OSError, EOFError):
+                    with lock:
+                        subscribers[channel].remove(subscriber)
+
+def socketio_options():
+    # Keyword arguments for SocketIO(app, ...): async server mode and the cross-process client manager
+    options = {'cors_allowed_origins': '*'}
+    if SOCKETIO_ASYNC_MODE:
+        options['async_mode'] = SOCKETIO_ASYNC_MODE
+    if urlsplit(SOCKETIO_MESSAGE_QUEUE).scheme == LOCAL_SCHEME:
+        options['client_manager'] = LocalBrokerManager(SOCKETIO_MESSAGE_QUEUE)
+    elif SOCKETIO_MESSAGE_QUEUE:
+        # redis://, kafka://, zmq+tcp:// or any Kombu URL, handled by python-socketio's own managers
+        options['message_queue'] = SOCKETIO_MESSAGE_QUEUE
+    return options
+
+def create_emitter():
+    # Write-only emitter for processes without a Socket.IO server; None without a message queue
+    if urlsplit(SOCKETIO_MESSAGE_QUEUE).scheme == LOCAL_SCHEME:
+        return LocalBrokerManager(SOCKETIO_MESSAGE_QUEUE, write_only=True)
+    if SOCKETIO_MESSAGE_QUEUE:
+        from flask_socketio import SocketIO
+        return SocketIO(message_queue=SOCKETIO_MESSAGE_QUEUE)
+    return None
+
+if __name__ == '__main__':
+    run_broker(SOCKETIO_MESSAGE_QUEUE or 'local://127.0.0.1:5055')
@@ -0,0 +1,27 @@
+import threading
+
+class TimingStat:
+    """Running count/last/average/max of a duration measured in seconds, reported in milliseconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            self.max = max(self.max, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'last_ms': round(self.last * 1000, 2),
+                'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+                'max_ms': round(self.max * 1000, 2)
+            }
@@ -0,0 +1,46 @@
+import time
+import cv2
+import numpy as np
+from config import MOTION_DOWNSCALE_WIDTH, MOTION_PIXEL_DELTA, MOTION_KEEPALIVE_INTERVAL, MOTION_DEFAULT_SENSITIVITY
+
+def motion_threshold(sensitivity):
+    # Fraction of changed pixels that counts as motion: 0.1% at sensitivity 1.0, ~5% at 0.0
+    sensitivity = min(max(float(sensitivity), 0.0), 1.0)
+    return 0.001 + 0.05 * (1.0 - sensitivity)
+
+class MotionGate:
+    """Cheap pre-filter that lets a frame through to the models only when the scene changed."""
+
+    def __init__(self, sensitivity=None, keepalive_interval=MOTION_KEEPALIVE_INTERVAL):
+        self.threshold = motion_threshold(MOTION_DEFAULT_SENSITIVITY if sensitivity is None else sensitivity)
+        self.keepalive_interval = keepalive_interval
+        self.last_motion = 0.0
+        self._background = None
+        self._last_pass = 0.0
+
+    def _prepare(self, frame):
+        height, width = frame.shape[:2]
+        scale = MOTION_DOWNSCALE_WIDTH / width
+        small = cv2.resize(frame, (MOTION_DOWNSCALE_WIDTH, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame):
+        gray = self._prepare(frame)
+        now = time.monotonic()
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            self._last_pass = now
+            return True
+
+        # Difference against a slowly updated background absorbs sensor noise and lighting drift
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        self.last_motion = np.count_nonzero(diff > MOTION_PIXEL_DELTA) / diff.size
+        cv2.accumulateWeighted(gray, self._background, 0.05)
+
+        # Still sample static scenes every keepalive_interval so slow changes are not missed
+        if self.last_motion >= self.threshold or now - self._last_pass >= self.keepalive_interval:
+            self._last_pass = now
+            return True
+        return False
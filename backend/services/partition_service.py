@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from config import DETECTION_PARTITION_INTERVAL, DETECTION_PARTITIONS_AHEAD
+
+# Catch-all partition for rows past the newest range; split by ensure_future_partitions
+MAX_PARTITION = 'pmax'
+
+def period_start(timestamp, interval=DETECTION_PARTITION_INTERVAL):
+    start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(day=1) if interval == 'month' else start
+
+def next_period(start, interval=DETECTION_PARTITION_INTERVAL):
+    if interval == 'month':
+        return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def partition_name(start):
+    return f"p{start:%Y%m%d}"
+
+def partition_horizon(now=None):
+    # Upper bound the newest range partition should reach
+    horizon = period_start(now or datetime.now())
+    for _ in range(DETECTION_PARTITIONS_AHEAD + 1):
+        horizon = next_period(horizon)
+    return horizon
+
+def partition_periods(first, until):
+    starts = []
+    start = period_start(first)
+    while start < until:
+        starts.append(start)
+        start = next_period(start)
+    return starts
+
+def _partition_definitions(starts):
+    # Bounds go through UNIX_TIMESTAMP(), the only function MySQL allows on a TIMESTAMP partitioning column
+    return [
+        f"PARTITION {partition_name(start)} VALUES LESS THAN (UNIX_TIMESTAMP('{next_period(start):%Y-%m-%d %H:%M:%S}'))"
+        for start in starts
+    ] + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE"]
+
+def partition_clause(starts):
+    return f"PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) ({', '.join(_partition_definitions(starts))})"
+
+def list_partitions(cursor):
+    # (name, upper bound) in order; the bound is None for the MAXVALUE partition
+    cursor.execute("""
+    SELECT PARTITION_NAME,
+           IF(PARTITION_DESCRIPTION = 'MAXVALUE', NULL, FROM_UNIXTIME(PARTITION_DESCRIPTION))
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'detections' AND PARTITION_NAME IS NOT NULL
+    ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return [(name, upper) for name, upper in cursor.fetchall()]
+
+def partition_detections(cursor):
+    # One-time conversion of an existing unpartitioned table; this rebuilds it, so it may take a while
+    if list_partitions(cursor):
+        return False
+
+    print("DETECTION_PARTITIONING is on: rebuilding the detections table partitioned by timestamp and dropping its "
+          "foreign keys. The table is locked until this finishes")
+
+    # Partitioned InnoDB tables cannot have foreign keys
+    cursor.execute("""
+    SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+    WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'detections'
+    """)
+    for (constraint,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE detections DROP FOREIGN KEY {constraint}")
+
+    # Single-column indexes left behind by those keys are covered by the composite (column, timestamp, id) ones
+    for column in ('camera_id', 'user_id', 'model_id'):
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'detections' AND INDEX_NAME = %s
+            """,
+            (column,)
+        )
+        if cursor.fetchone()[0] > 0:
+            cursor.execute(f"DROP INDEX {column} ON detections")
+
+    # Every unique key must contain the partitioning column
+    cursor.execute("""
+    ALTER TABLE detections
+        MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (id, timestamp)
+    """)
+
+    cursor.execute("SELECT MIN(timestamp) FROM detections")
+    first = cursor.fetchone()[0] or datetime.now()
+    cursor.execute(f"ALTER TABLE detections {partition_clause(partition_periods(first, partition_horizon()))}")
+    return True
+
+def ensure_future_partitions(cursor, now=None):
+    # Keeps DETECTION_PARTITIONS_AHEAD empty ranges ahead of now by splitting the (normally empty) MAXVALUE partition
+    partitions = list_partitions(cursor)
+    if not partitions:
+        return []
+
+    # Continue from the newest bound as is, in case DETECTION_PARTITION_INTERVAL changed since it was made
+    bounds = [upper for _, upper in partitions if upper is not None]
+    start = bounds[-1] if bounds else period_start(now or datetime.now())
+    horizon = partition_horizon(now)
+    starts = []
+    while start < horizon:
+        starts.append(start)
+        start = next_period(start)
+    if not starts:
+        return []
+
+    name, upper = partitions[-1]
+    if upper is None:
+        cursor.execute(f"ALTER TABLE detections REORGANIZE PARTITION {name} INTO ({', '.join(_partition_definitions(starts))})")
+    else:
+        cursor.execute(f"ALTER TABLE detections ADD PARTITION ({', '.join(_partition_definitions(starts)[:-1])})")
+    return [partition_name(start) for start in starts]
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from config import SOCKETIO_BATCH_INTERVAL, SOCKETIO_BATCH_MAX
+
+# Every admin socket joins this room and receives all cameras' events
+ADMIN_ROOM = 'admins'
+
+# Events coalesced per room, and the event their batches are sent as
+BATCHED_EVENTS = {'detection_alert': 'detection_alerts'}
+
+def user_room(user_id):
+    return f"user_{user_id}"
+
+def owner_rooms(user_id):
+    # A camera owner's events also go to the admins; clients in both rooms get them once
+    return [user_room(user_id), ADMIN_ROOM]
+
+class BatchingEmitter:
+    """Wraps a Socket.IO emitter and sends bursts of alerts as one list per room every tick."""
+
+    def __init__(self, emitter, interval=SOCKETIO_BATCH_INTERVAL, max_batch=SOCKETIO_BATCH_MAX):
+        self.emitter = emitter
+        self.interval = interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._batches = {}
+        self._thread = None
+        self._pid = None
+        self._stats = {'alerts': 0, 'batches': 0}
+
+    def _ensure_started(self):
+        # One flush thread per process, as with the detection writer
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._batches = {}
+                self._thread = threading.Thread(target=self._run, name='alert-batcher', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def emit(self, event, data, room=None, **kwargs):
+        if event not in BATCHED_EVENTS or self.interval <= 0:
+            self.emitter.emit(event, data, room=room, **kwargs)
+            return
+
+        self._ensure_started()
+        # Batched per room list, i.e. per camera owner: one emit to [owner, admins] reaches a client in both
+        # rooms once, which separate per-room batches would not. Admins get one batch per owner per tick.
+        key = (event, tuple(room) if isinstance(room, list) else room)
+        with self._lock:
+            self._stats['alerts'] += 1
+            batch = self._batches.setdefault(key, [])
+            batch.append(data)
+            full = len(batch) >= self.max_batch
+            if full:
+                del self._batches[key]
+        if full:
+            self._send(key, batch)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                batches, self._batches = self._batches, {}
+            for key, batch in batches.items():
+                self._send(key, batch)
+
+    def _send(self, key, batch):
+        event, room = key
+        try:
+            self.emitter.emit(BATCHED_EVENTS[event], batch, room=list(room) if isinstance(room, tuple) else room)
+        except Exception as e:
+            print(f"Error sending {len(batch)} alerts to {room}: {str(e)}")
+            return
+        with self._lock:
+            self._stats['batches'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(batch) for batch in self._batches.values())
+        stats['avg_batch_size'] = round(stats['alerts'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
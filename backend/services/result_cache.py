@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from config import RESULT_CACHE_ENABLED, RESULT_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_MAX_DISTANCE
+
+# 16x16 gradient bits: fine enough that an object entering part of the scene changes the hash
+HASH_SIZE = 16
+
+def dhash(frame):
+    # Difference hash of a small grayscale thumbnail; near-identical frames differ in few bits
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+class ResultCache:
+    """Per camera and model LRU of inference responses keyed by perceptual frame hash, with a TTL."""
+
+    def __init__(self, ttl, max_entries, max_distance):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._counters = {}
+
+    def _count(self, camera_id, model_id, hit):
+        counter = self._counters.setdefault((camera_id, model_id), [0, 0])
+        counter[0 if hit else 1] += 1
+
+    def get(self, camera_id, model_id, frame_hash):
+        now = time.monotonic()
+        with self._lock:
+            # Scoped to the camera too: two cameras on similar scenes must not share detections
+            entries = self._entries.get((camera_id, model_id))
+            if entries:
+                # Drop expired entries from the old end of the LRU first
+                while entries:
+                    oldest_hash, (_, stored_at) = next(iter(entries.items()))
+                    if now - stored_at <= self.ttl:
+                        break
+                    del entries[oldest_hash]
+
+                match = frame_hash if frame_hash in entries else None
+                if match is None and self.max_distance > 0:
+                    for cached_hash in reversed(entries):
+                        if hamming_distance(cached_hash, frame_hash) <= self.max_distance:
+                            match = cached_hash
+                            break
+
+                if match is not None and now - entries[match][1] <= self.ttl:
+                    entries.move_to_end(match)
+                    self._count(camera_id, model_id, True)
+                    return entries[match][0]
+
+            self._count(camera_id, model_id, False)
+            return None
+
+    def put(self, camera_id, model_id, frame_hash, response):
+        with self._lock:
+            entries = self._entries.setdefault((camera_id, model_id), OrderedDict())
+            entries[frame_hash] = (response, time.monotonic())
+            entries.move_to_end(frame_hash)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            counters = {key: list(value) for key, value in self._counters.items()}
+
+        by_camera = {}
+        by_model = {}
+        for (camera_id, model_id), (hits, misses) in counters.items():
+            for group, key in ((by_camera, str(camera_id)), (by_model, str(model_id))):
+                totals = group.setdefault(key, {'hits': 0, 'misses': 0})
+                totals['hits'] += hits
+                totals['misses'] += misses
+
+        for group in (by_camera, by_model):
+            for totals in group.values():
+                lookups = totals['hits'] + totals['misses']
+                totals['hit_ratio'] = round(totals['hits'] / lookups, 4) if lookups else 0.0
+
+        return {'by_camera': by_camera, 'by_model': by_model}
+
+result_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_MAX_DISTANCE) if RESULT_CACHE_ENABLED else None
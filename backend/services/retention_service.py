@@ -0,0 +1,260 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from mysql.connector import Error
+from config import (DETECTION_PARTITIONING, DETECTION_RETENTION_DAYS, DETECTION_ARCHIVE_DIR,
+                    DETECTION_ARCHIVE_FORMAT, RETENTION_CHECK_INTERVAL, STREAM_CHUNK_SIZE)
+from services.db_service import get_db_connection
+from services.partition_service import list_partitions, ensure_future_partitions
+
+ARCHIVE_EXTENSIONS = {'ndjson': '.ndjson.gz', 'parquet': '.parquet'}
+MANIFEST_FILE = 'manifest.json'
+TIME_COLUMNS = ('timestamp', 'ended_at', 'created_at')
+
+# Advisory lock so only one process at a time reorganizes or drops partitions
+RETENTION_LOCK = 'detection_retention'
+
+def _archive_row(row):
+    # Archived rows look like API rows: ISO timestamps and parsed metadata
+    row = dict(row)
+    for column in TIME_COLUMNS:
+        if isinstance(row.get(column), datetime):
+            row[column] = row[column].isoformat()
+    if isinstance(row.get('metadata'), (str, bytes)):
+        try:
+            row['metadata'] = json.loads(row['metadata'])
+        except ValueError:
+            row['metadata'] = {}
+    return row
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ('id', pa.int32()),
+        ('camera_id', pa.int32()),
+        ('user_id', pa.int32()),
+        ('model_id', pa.int32()),
+        ('detection_type', pa.string()),
+        ('confidence_score', pa.float32()),
+        ('timestamp', pa.timestamp('s')),
+        ('metadata', pa.string()),
+        ('ended_at', pa.timestamp('s')),
+        ('hit_count', pa.int32()),
+        ('video_clip_path', pa.string()),
+        ('created_at', pa.timestamp('s'))
+    ])
+
+def _write_ndjson(path, chunks):
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        for rows in chunks:
+            archive.write(''.join(json.dumps(_archive_row(row)) + '\n' for row in rows))
+
+def _write_parquet(path, chunks):
+    # Optional dependency: pip install pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa)
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for rows in chunks:
+            # Metadata stays a JSON string so every row group shares one schema
+            table = [dict(row, metadata=json.dumps(_archive_row(row)['metadata'])) for row in rows]
+            writer.write_table(pa.Table.from_pylist(table, schema=schema))
+
+def _read_ndjson(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+def _read_parquet(path):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=STREAM_CHUNK_SIZE):
+        for row in batch.to_pylist():
+            yield _archive_row(row)
+
+ARCHIVE_WRITERS = {'ndjson': _write_ndjson, 'parquet': _write_parquet}
+ARCHIVE_READERS = {'ndjson': _read_ndjson, 'parquet': _read_parquet}
+
+def load_manifest(archive_dir=DETECTION_ARCHIVE_DIR):
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as manifest:
+        return json.load(manifest)
+
+def archived_partitions(since=None, until=None, archive_dir=DETECTION_ARCHIVE_DIR):
+    # Manifest entries whose [from, to) range overlaps [since, until), oldest first
+    entries = []
+    for entry in load_manifest(archive_dir):
+        if since and datetime.fromisoformat(entry['to']) <= since:
+            continue
+        if until and entry['from'] and datetime.fromisoformat(entry['from']) >= until:
+            continue
+        entries.append(entry)
+    return entries
+
+def iter_archived_rows(since=None, until=None, archive_dir=DETECTION_ARCHIVE_DIR):
+    # Rows come back in (timestamp, id) order, one archive file at a time
+    for entry in archived_partitions(since, until, archive_dir):
+        yield from ARCHIVE_READERS[entry['format']](os.path.join(archive_dir, entry['file']))
+
+class RetentionJob:
+    """Keeps future detection partitions ready and archives, then drops, partitions past the retention window."""
+
+    def __init__(self, interval=RETENTION_CHECK_INTERVAL, retention_days=DETECTION_RETENTION_DAYS,
+                 archive_dir=DETECTION_ARCHIVE_DIR, archive_format=DETECTION_ARCHIVE_FORMAT):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.archive_format = archive_format
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'runs': 0,
+            'partitions_created': 0,
+            'partitions_archived': 0,
+            'partitions_dropped': 0,
+            'rows_archived': 0,
+            'last_run': None,
+            'last_error': None
+        }
+
+    def start(self):
+        if not DETECTION_PARTITIONING:
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='detection-retention', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.run_once()
+            time.sleep(self.interval)
+
+    def run_once(self, now=None):
+        conn = get_db_connection()
+        if not conn:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (RETENTION_LOCK,))
+            if not cursor.fetchone()[0]:
+                return
+            try:
+                created = ensure_future_partitions(cursor, now)
+                with self._lock:
+                    self._stats['partitions_created'] += len(created)
+                self._expire(cursor, now or datetime.now())
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (RETENTION_LOCK,))
+                cursor.fetchone()
+            with self._lock:
+                self._stats['last_error'] = None
+        except (Error, OSError, ImportError) as e:
+            print(f"Error in detection retention job: {str(e)}")
+            with self._lock:
+                self._stats['last_error'] = str(e)
+        finally:
+            with self._lock:
+                self._stats['runs'] += 1
+                self._stats['last_run'] = datetime.now().isoformat()
+            cursor.close()
+            conn.close()
+
+    def _expire(self, cursor, now):
+        if self.retention_days <= 0:
+            return
+        cutoff = now - timedelta(days=self.retention_days)
+
+        # Range partitions only store their upper bound. The oldest remaining one starts where the last
+        # archived partition ended (an entry for this same partition, left by a failed drop, does not count).
+        archived = [datetime.fromisoformat(entry['to']) for entry in load_manifest(self.archive_dir)]
+        for name, upper in list_partitions(cursor):
+            # Only whole partitions go, so rows live up to one partition longer than the retention window
+            if upper is None or upper > cutoff:
+                break
+            if self.archive_format != 'none':
+                lower = max((bound for bound in archived if bound < upper), default=None)
+                self._archive_partition(name, lower, upper)
+                archived.append(upper)
+            cursor.execute(f"ALTER TABLE detections DROP PARTITION {name}")
+            with self._lock:
+                self._stats['partitions_dropped'] += 1
+
+    def _archive_partition(self, name, lower, upper):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        filename = f"detections_{name}{ARCHIVE_EXTENSIONS[self.archive_format]}"
+        path = os.path.join(self.archive_dir, filename)
+        summary = {'rows': 0, 'first': None, 'last': None}
+
+        # Streamed in chunks from one partition, so memory does not grow with the partition size.
+        # A connection of its own, so a failed archive can be dropped without reading its remaining rows.
+        conn = get_db_connection()
+        if not conn:
+            raise OSError(f"No database connection to archive partition {name}")
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(f"SELECT * FROM detections PARTITION ({name}) ORDER BY timestamp, id")
+
+            def chunks():
+                while True:
+                    rows = cursor.fetchmany(STREAM_CHUNK_SIZE)
+                    if not rows:
+                        return
+                    summary['rows'] += len(rows)
+                    summary['first'] = summary['first'] or rows[0]['timestamp']
+                    summary['last'] = rows[-1]['timestamp']
+                    yield rows
+
+            ARCHIVE_WRITERS[self.archive_format](path + '.tmp', chunks())
+        except BaseException:
+            conn.discard()
+            raise
+        cursor.close()
+        conn.close()
+        os.replace(path + '.tmp', path)
+
+        self._add_to_manifest({
+            'partition': name,
+            'format': self.archive_format,
+            'file': filename,
+            'from': lower.isoformat() if lower else None,
+            'to': upper.isoformat(),
+            'rows': summary['rows'],
+            'first_timestamp': summary['first'].isoformat() if summary['first'] else None,
+            'last_timestamp': summary['last'].isoformat() if summary['last'] else None,
+            'archived_at': datetime.now().isoformat()
+        })
+        with self._lock:
+            self._stats['partitions_archived'] += 1
+            self._stats['rows_archived'] += summary['rows']
+
+    def _add_to_manifest(self, entry):
+        # A partition archived again after a failed drop replaces its earlier entry
+        entries = [e for e in load_manifest(self.archive_dir) if e['partition'] != entry['partition']]
+        entries.append(entry)
+        entries.sort(key=lambda e: e['to'])
+
+        path = os.path.join(self.archive_dir, MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as manifest:
+            json.dump(entries, manifest, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'enabled': DETECTION_PARTITIONING,
+            'retention_days': self.retention_days,
+            'archive_format': self.archive_format
+        })
+        return stats
+
+# Started once from app.py next to the camera threads
+retention_job = RetentionJob()
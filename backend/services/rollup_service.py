@@ -0,0 +1,95 @@
+ROLLUP_TABLES = {
+    'minute': 'detection_rollup_minute',
+    'hour': 'detection_rollup_hour',
+    'day': 'detection_rollup_day'
+}
+
+ROLLUP_KEY = ('bucket_start', 'user_id', 'camera_id', 'model_id', 'detection_type')
+
+# MySQL expressions truncating detections.timestamp to each bucket, used by the backfill
+_BUCKET_SQL = {
+    'minute': "DATE_FORMAT(timestamp, '%Y-%m-%d %H:%i:00')",
+    'hour': "DATE_FORMAT(timestamp, '%Y-%m-%d %H:00:00')",
+    'day': "DATE(timestamp)"
+}
+
+def bucket_start(timestamp, granularity):
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def create_rollup_tables(cursor):
+    for table in ROLLUP_TABLES.values():
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket_start DATETIME NOT NULL,
+            user_id INT NOT NULL,
+            camera_id INT NOT NULL,
+            model_id INT NOT NULL,
+            detection_type VARCHAR(50) NOT NULL,
+            detection_count INT NOT NULL DEFAULT 0,
+            hit_count INT NOT NULL DEFAULT 0,
+            confidence_sum DOUBLE NOT NULL DEFAULT 0,
+            confidence_max FLOAT NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket_start, user_id, camera_id, model_id, detection_type),
+            INDEX idx_{table}_user (user_id, bucket_start),
+            INDEX idx_{table}_camera (camera_id, bucket_start)
+        )
+        """)
+
+def backfill_rollups(cursor):
+    # One-time fill from existing detections, when the rollups are new and the detections are not
+    cursor.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLES['day']}")
+    if cursor.fetchone()[0] > 0:
+        return
+    cursor.execute("SELECT COUNT(*) FROM detections")
+    if cursor.fetchone()[0] == 0:
+        return
+
+    for granularity, table in ROLLUP_TABLES.items():
+        cursor.execute(f"""
+        INSERT INTO {table} ({', '.join(ROLLUP_KEY)}, detection_count, hit_count, confidence_sum, confidence_max)
+        SELECT {_BUCKET_SQL[granularity]}, user_id, camera_id, model_id, detection_type,
+               COUNT(*), SUM(hit_count), SUM(confidence_score), MAX(confidence_score)
+        FROM detections
+        GROUP BY 1, user_id, camera_id, model_id, detection_type
+        """)
+
+def delete_rollups(cursor, column, value):
+    # Drops a deleted camera's, user's or model's buckets outright; exact, unlike subtracting single rows
+    if column not in ('user_id', 'camera_id', 'model_id'):
+        raise ValueError(f"Cannot delete rollups by {column}")
+    for table in ROLLUP_TABLES.values():
+        cursor.execute(f"DELETE FROM {table} WHERE {column} = %s", (value,))
+
+def write_rollups(cursor, entries):
+    # entries: (row, detections, hits, confidence_sum, confidence_max) where row has the key columns and a timestamp
+    for granularity, table in ROLLUP_TABLES.items():
+        merged = {}
+        for row, detections, hits, confidence_sum, confidence_max in entries:
+            key = (bucket_start(row['timestamp'], granularity), row['user_id'], row['camera_id'],
+                   row['model_id'], row['detection_type'])
+            totals = merged.setdefault(key, [0, 0, 0.0, 0.0])
+            totals[0] += detections
+            totals[1] += hits
+            totals[2] += confidence_sum
+            totals[3] = max(totals[3], confidence_max)
+
+        if not merged:
+            continue
+
+        # Rows of one batch are merged first, so each bucket costs one upsert row
+        cursor.executemany(
+            f"""
+            INSERT INTO {table} ({', '.join(ROLLUP_KEY)}, detection_count, hit_count, confidence_sum, confidence_max)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                detection_count = detection_count + VALUES(detection_count),
+                hit_count = hit_count + VALUES(hit_count),
+                confidence_sum = confidence_sum + VALUES(confidence_sum),
+                confidence_max = GREATEST(confidence_max, VALUES(confidence_max))
+            """,
+            [key + tuple(totals) for key, totals in merged.items()]
+        )
@@ -0,0 +1,83 @@
+import heapq
+import threading
+import time
+from services.metrics_service import TimingStat
+
+# Jobs due within this many seconds of each other run in the same tick, on the same frame
+COALESCE_WINDOW = 0.02
+
+# Shortest interval a schedule row may ask for
+MIN_INTERVAL = 0.05
+
+def fetch_schedule(cursor, camera_id, models, default_interval):
+    # [(model, interval_seconds)] for the camera; every model at default_interval when it has no schedule rows
+    cursor.execute(
+        "SELECT model_id, interval_seconds, enabled FROM camera_model_schedules WHERE camera_id = %s",
+        (camera_id,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return [(model, default_interval) for model in models]
+
+    models_by_id = {model['id']: model for model in models}
+    return [
+        (models_by_id[row['model_id']], max(MIN_INTERVAL, float(row['interval_seconds'])))
+        for row in rows
+        if row['enabled'] and row['model_id'] in models_by_id
+    ]
+
+class CameraSchedule:
+    """Runs each (model, interval) job of one camera on its own clock and tracks how late each run starts."""
+
+    def __init__(self, jobs):
+        now = time.monotonic()
+        self._lock = threading.Lock()
+        self._heap = []
+        self._jobs = {}
+        for index, (model, interval) in enumerate(jobs):
+            self._jobs[model['id']] = {
+                'model': model,
+                'interval': interval,
+                'runs': 0,
+                'missed': 0,
+                'lag': TimingStat()
+            }
+            heapq.heappush(self._heap, (now, index, model['id']))
+
+    def next_due(self):
+        # Monotonic time the next job is due, None for an empty schedule
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        # Models due by now, each rescheduled on its own cadence
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now + COALESCE_WINDOW:
+                due_at, index, model_id = heapq.heappop(self._heap)
+                job = self._jobs[model_id]
+                job['runs'] += 1
+                job['lag'].record(max(0.0, now - due_at))
+
+                next_at = due_at + job['interval']
+                if next_at <= now:
+                    # A whole period or more behind: drop the missed runs instead of bursting to catch up
+                    missed = int((now - due_at) // job['interval'])
+                    job['missed'] += missed
+                    next_at = due_at + (missed + 1) * job['interval']
+                heapq.heappush(self._heap, (next_at, index, model_id))
+                due.append(job['model'])
+        return due
+
+    def stats(self):
+        with self._lock:
+            return {
+                str(model_id): {
+                    'model': job['model']['name'],
+                    'interval_seconds': job['interval'],
+                    'runs': job['runs'],
+                    'missed': job['missed'],
+                    'lag': job['lag'].as_dict()
+                }
+                for model_id, job in self._jobs.items()
+            }
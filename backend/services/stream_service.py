@@ -0,0 +1,101 @@
+from itertools import islice
+from flask import Response, current_app
+from mysql.connector import Error
+from config import STREAM_CHUNK_SIZE
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson'
+}
+
+def _close_quietly(conn, cursor):
+    try:
+        cursor.close()
+    except Error:
+        pass
+    conn.close()
+
+def _encode_chunks(chunks, fmt, transform, dumps):
+    if fmt == 'json':
+        yield '['
+    first = True
+    for rows in chunks:
+        parts = []
+        for row in rows:
+            if transform:
+                row = transform(row)
+            if fmt == 'ndjson':
+                parts.append(dumps(row) + '\n')
+            else:
+                parts.append(dumps(row) if first else ',' + dumps(row))
+                first = False
+        yield ''.join(parts)
+    if fmt == 'json':
+        yield ']'
+
+class ClosingStream:
+    """Response body over an open cursor that releases it when the body ends or the client goes away."""
+
+    def __init__(self, conn, cursor, body):
+        self.conn = conn
+        self.cursor = cursor
+        self.body = iter(body)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.body)
+        except StopIteration:
+            self._release(finished=True)
+            raise
+
+    def close(self):
+        # Called by the WSGI server after the last chunk, on a client disconnect, or when the body raised
+        self._release(finished=False)
+
+    def _release(self, finished):
+        if self.closed:
+            return
+        self.closed = True
+        if hasattr(self.body, 'close'):
+            self.body.close()
+        if finished:
+            _close_quietly(self.conn, self.cursor)
+        else:
+            # Unread rows are left behind; returning the connection to the pool would read them all first
+            self.conn.discard()
+
+def iter_json_rows(conn, cursor, fmt, transform=None, chunk_size=STREAM_CHUNK_SIZE):
+    # Pulls rows from an unbuffered cursor in chunks so memory stays flat regardless of result size
+    dumps = current_app.json.dumps
+    chunks = iter(lambda: cursor.fetchmany(chunk_size), [])
+    return ClosingStream(conn, cursor, _encode_chunks(chunks, fmt, transform, dumps))
+
+def streaming_response(body, mimetype):
+    response = Response(body, mimetype=mimetype)
+    # Ask reverse proxies not to buffer the body so the first rows reach the client right away
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def stream_rows(rows, fmt, transform=None, chunk_size=STREAM_CHUNK_SIZE):
+    # Same encoding for any row iterator (e.g. archive files); rows are only read as the client consumes them
+    rows = iter(rows)
+    chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+    return streaming_response(_encode_chunks(chunks, fmt, transform, current_app.json.dumps), STREAM_FORMATS[fmt])
+
+def open_stream(conn, query, params, dictionary=True):
+    # Executes on an unbuffered cursor before the response starts, so query errors still become a 500
+    cursor = conn.cursor(dictionary=dictionary, buffered=False)
+    try:
+        cursor.execute(query, params)
+    except Error:
+        _close_quietly(conn, cursor)
+        raise
+    return cursor
+
+def stream_query(conn, query, params, fmt, transform=None):
+    cursor = open_stream(conn, query, params)
+    return streaming_response(iter_json_rows(conn, cursor, fmt, transform), STREAM_FORMATS[fmt])
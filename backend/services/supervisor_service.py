@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import MOTION_GATING, CAMERA_INTERVAL, CAMERA_WORKER_BUDGET, CAMERA_DECODE_WORKERS
+from services.camera_service import load_camera_context, handle_results, get_capture_stats, stream_status_listener
+from services.frame_service import FramePreparer, parse_roi
+from services.grabber_service import acquire_grabber, release_grabber, swap_grabber_source
+from services.inference_service import submit_frame, wait_timeout, collect_results
+from services.motion_service import MotionGate
+
+_supervisor = None
+
+# How often a tick re-checks the grabber when its due models are waiting for a new frame
+FRAME_POLL_INTERVAL = 0.02
+
+class CameraSupervisor:
+    """Runs every camera on one event loop with a fixed worker budget instead of a thread per camera."""
+
+    def __init__(self, socketio, interval=CAMERA_INTERVAL, worker_budget=CAMERA_WORKER_BUDGET,
+                 decode_workers=CAMERA_DECODE_WORKERS):
+        self.socketio = socketio
+        self.interval = interval
+        self.worker_budget = worker_budget
+        self.loop = asyncio.new_event_loop()
+        # RTSP reads/decodes and CPU work (motion, JPEG encoding) run on bounded pools, never on the loop
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='decode')
+        self._work_pool = ThreadPoolExecutor(max_workers=worker_budget, thread_name_prefix='camera-work')
+        self._budget = None
+        self._cameras = {}
+        self._stopping = {}
+        self._health = {}
+        self._health_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run_loop, name='camera-supervisor', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._budget = asyncio.Semaphore(self.worker_budget)
+        self.loop.run_forever()
+
+    def add_camera(self, camera):
+        return asyncio.run_coroutine_threadsafe(self._add_camera(camera), self.loop)
+
+    def remove_camera(self, camera_id):
+        return asyncio.run_coroutine_threadsafe(self._remove_camera(camera_id), self.loop)
+
+    def swap_source(self, camera):
+        return swap_grabber_source(camera['id'], camera['ip_address'])
+
+    async def _add_camera(self, camera):
+        # On a restart the old task must release the grabber first, or both tasks would read the same capture
+        while camera['id'] in self._stopping:
+            await asyncio.wait([self._stopping[camera['id']]])
+        if camera['id'] in self._cameras:
+            return
+        stop_event = asyncio.Event()
+        task = self.loop.create_task(self._run_camera(camera['id'], camera['ip_address'], stop_event))
+        self._cameras[camera['id']] = (task, stop_event)
+        print(f"Scheduled camera {camera['id']} - {camera['name']} on the supervisor")
+
+    async def _remove_camera(self, camera_id):
+        entry = self._cameras.pop(camera_id, None)
+        if entry:
+            task, stop_event = entry
+            stop_event.set()
+            self._stopping[camera_id] = task
+            try:
+                await asyncio.wait([task])
+            finally:
+                if self._stopping.get(camera_id) is task:
+                    del self._stopping[camera_id]
+
+    def _set_health(self, camera_id, **fields):
+        with self._health_lock:
+            self._health.setdefault(camera_id, {'state': 'starting', 'ticks': 0, 'errors': 0}).update(fields)
+
+    def _bump_health(self, camera_id, field):
+        with self._health_lock:
+            health = self._health.setdefault(camera_id, {'state': 'starting', 'ticks': 0, 'errors': 0})
+            health[field] += 1
+
+    def health(self):
+        with self._health_lock:
+            return {str(camera_id): dict(health) for camera_id, health in self._health.items()}
+
+    async def _run_camera(self, camera_id, rtsp_url, stop_event):
+        self._set_health(camera_id, state='starting')
+        camera_data, schedule = await self.loop.run_in_executor(self._work_pool, load_camera_context, camera_id, self.interval)
+        if not camera_data:
+            self._set_health(camera_id, state='error', last_error='Camera or database unavailable')
+            return
+
+        grabber = acquire_grabber(camera_id, rtsp_url, external=True)
+        status_listener = stream_status_listener(camera_data, self.socketio)
+        grabber.add_listener(status_listener)
+        reader = None
+        try:
+            if grabber.external:
+                reader = self.loop.create_task(self._read_frames(grabber, stop_event))
+            await self._tick_frames(camera_id, camera_data, schedule, grabber, stop_event)
+        finally:
+            stop_event.set()
+            if reader:
+                # Let the in-progress read finish so nobody else touches the capture concurrently
+                await reader
+            grabber.remove_listener(status_listener)
+            release_grabber(grabber, reader=reader is not None)
+            if self._health.get(camera_id, {}).get('state') != 'error':
+                self._set_health(camera_id, state='stopped')
+
+    async def _read_frames(self, grabber, stop_event):
+        # Keeps draining the stream so ticks always see the newest frame, reconnecting with backoff when it drops
+        connected = await self.loop.run_in_executor(self._decode_pool, grabber.connect)
+        while not stop_event.is_set() and not grabber.stopped:
+            if connected and await self.loop.run_in_executor(self._decode_pool, grabber.read_once):
+                continue
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=grabber.next_backoff())
+                return
+            except asyncio.TimeoutError:
+                pass
+            connected = await self.loop.run_in_executor(self._decode_pool, grabber.connect)
+
+    async def _tick_frames(self, camera_id, camera_data, schedule, grabber, stop_event):
+        preparer = FramePreparer(parse_roi(camera_data.get('roi')))
+        capture_stats = get_capture_stats(camera_id)
+        capture_stats.schedule = schedule
+        capture_stats.preparer = preparer
+        motion_gate = MotionGate(camera_data.get('motion_sensitivity')) if MOTION_GATING else None
+        last_seq = 0
+
+        while not stop_event.is_set():
+            # Sleep until the next model is due
+            next_due = schedule.next_due()
+            delay = self.interval if next_due is None else next_due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            if next_due is None:
+                continue
+
+            if grabber.stopped:
+                self._set_health(camera_id, state='error', last_error=grabber.last_error or 'Stream closed')
+                return
+
+            entry = grabber.latest()
+            if entry is None or entry['seq'] <= last_seq:
+                # No new frame yet: check again shortly rather than rerun models on a stale frame
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=FRAME_POLL_INTERVAL)
+                    return
+                except asyncio.TimeoutError:
+                    continue
+
+            # Every model due in this tick runs on the same decoded frame
+            models = schedule.pop_due(time.monotonic())
+            if not models:
+                continue
+            capture_stats.record_sample(entry, last_seq)
+            last_seq = entry['seq']
+            try:
+                async with self._budget:
+                    await self._process_frame(camera_id, camera_data, models, entry, preparer, motion_gate, capture_stats)
+                self._bump_health(camera_id, 'ticks')
+                self._set_health(camera_id, state='running', last_tick_at=time.time(), last_frame_at=entry['captured_at'])
+            except Exception as e:
+                self._bump_health(camera_id, 'errors')
+                self._set_health(camera_id, last_error=str(e))
+                print(f"Error processing frame for camera {camera_id}: {str(e)}")
+
+    async def _process_frame(self, camera_id, camera_data, models, entry, preparer, motion_gate, capture_stats):
+        frame = entry['frame']
+        if motion_gate:
+            moving = await self.loop.run_in_executor(self._work_pool, motion_gate.should_infer, preparer.crop(frame))
+            if not moving:
+                capture_stats.record_motion_skip()
+                return
+
+        preparer.new_tick(frame)
+        # Encoding and request submission happen off the loop; the loop only awaits the responses
+        results, futures, frame_hash = await self.loop.run_in_executor(
+            self._work_pool, submit_frame, models, preparer, camera_id
+        )
+        if futures:
+            await asyncio.wait([asyncio.wrap_future(future) for future in futures], timeout=wait_timeout(futures))
+        results = collect_results(results, futures, frame_hash, preparer, camera_id)
+        handle_results(camera_data, results, self.socketio, entry['captured_at'])
+
+def start_supervisor(socketio):
+    global _supervisor
+    _supervisor = CameraSupervisor(socketio)
+    _supervisor.start()
+    return _supervisor
+
+def get_supervisor():
+    return _supervisor
+
+def get_supervisor_health():
+    return _supervisor.health() if _supervisor else None
@@ -0,0 +1,249 @@
+import bisect
+import hashlib
+import multiprocessing
+import queue
+import threading
+import time
+from config import CAMERA_INTERVAL, CAMERA_WORKER_PROCESSES
+from services.grabber_service import swap_grabber_source
+
+_pool = None
+
+class HashRing:
+    """Consistent hashing of camera ids onto workers; adding or removing a worker moves few cameras."""
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(str(key).encode()).hexdigest()[:16], 16)
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}:{replica}")
+            self._nodes[point] = node
+            bisect.insort(self._keys, point)
+
+    def remove(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}:{replica}")
+            if self._nodes.pop(point, None) is not None:
+                self._keys.remove(point)
+
+    def node_for(self, key):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+class QueueEmitter:
+    """Stands in for socketio inside a worker process: emits travel back to the web process."""
+
+    def __init__(self, events):
+        self._events = events
+
+    def emit(self, event, data, room=None, **kwargs):
+        self._events.put(('emit', event, data, room))
+
+def worker_main(worker_id, commands, events, interval):
+    # Runs in the child process: a thread per assigned camera, detections committed by this process's writer
+    from services.camera_service import capture_frames
+    from services.message_queue import create_emitter
+    from services.realtime_service import BatchingEmitter
+
+    # With a message queue, alerts are published straight to every server process; otherwise relayed by the parent
+    emitter = BatchingEmitter(create_emitter() or QueueEmitter(events))
+    cameras = {}
+
+    def start_camera(camera):
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=capture_frames,
+            args=(camera['id'], camera['ip_address'], emitter, interval, stop_event),
+            daemon=True
+        )
+        thread.start()
+        cameras[camera['id']] = (thread, stop_event, camera)
+        print(f"Worker {worker_id} started camera {camera['id']} - {camera['name']}")
+
+    def stop_camera(camera_id):
+        entry = cameras.pop(camera_id, None)
+        if entry:
+            thread, stop_event, _ = entry
+            stop_event.set()
+            thread.join(timeout=10)
+        return entry
+
+    while True:
+        command = commands.get()
+        action = command[0]
+
+        if action == 'add':
+            if command[1]['id'] not in cameras:
+                start_camera(command[1])
+
+        elif action == 'remove':
+            if stop_camera(command[1]):
+                print(f"Worker {worker_id} stopped camera {command[1]}")
+
+        elif action == 'swap':
+            camera_id, rtsp_url = command[1], command[2]
+            if not swap_grabber_source(camera_id, rtsp_url) and camera_id in cameras:
+                # No streaming grabber to hand over: restart the camera's thread on the new URL
+                camera = dict(stop_camera(camera_id)[2], ip_address=rtsp_url)
+                start_camera(camera)
+
+        elif action == 'shutdown':
+            for thread, stop_event, _ in cameras.values():
+                stop_event.set()
+            for thread, _, _ in cameras.values():
+                thread.join(timeout=10)
+            return
+
+class WorkerPool:
+    """Shards active cameras across worker processes and relays their alerts to Socket.IO."""
+
+    def __init__(self, socketio, interval=CAMERA_INTERVAL):
+        self.socketio = socketio
+        self.interval = interval
+        # spawn: worker processes must not inherit the web process's threads, sockets or DB connections
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.Queue()
+        self._workers = {}
+        self._ring = HashRing()
+        self._cameras = {}
+        self._assignment = {}
+        self._next_worker_id = 0
+        self._lock = threading.RLock()
+        self._relay = threading.Thread(target=self._relay_events, name='worker-relay', daemon=True)
+        self._relay.start()
+
+    def add_worker(self):
+        with self._lock:
+            worker_id = self._next_worker_id
+            self._next_worker_id += 1
+            commands = self._context.Queue()
+            process = self._context.Process(
+                target=worker_main,
+                args=(worker_id, commands, self._events, self.interval),
+                name=f"camera-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self._workers[worker_id] = (process, commands)
+            self._ring.add(worker_id)
+            self._rebalance()
+            return worker_id
+
+    def remove_worker(self, worker_id):
+        with self._lock:
+            entry = self._workers.pop(worker_id, None)
+            if not entry:
+                return
+            self._ring.remove(worker_id)
+            process, commands = entry
+            if process.is_alive():
+                commands.put(('shutdown',))
+            # Cameras it owned are reassigned on the remaining workers
+            for camera_id, assigned in list(self._assignment.items()):
+                if assigned == worker_id:
+                    del self._assignment[camera_id]
+            self._rebalance()
+
+    def add_camera(self, camera):
+        with self._lock:
+            self._cameras[camera['id']] = {
+                'id': camera['id'],
+                'name': camera['name'],
+                'ip_address': camera['ip_address']
+            }
+            self._rebalance()
+
+    def remove_camera(self, camera_id):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+            worker_id = self._assignment.pop(camera_id, None)
+            if worker_id in self._workers:
+                self._workers[worker_id][1].put(('remove', camera_id))
+
+    def swap_source(self, camera):
+        with self._lock:
+            if camera['id'] in self._cameras:
+                self._cameras[camera['id']]['ip_address'] = camera['ip_address']
+            worker_id = self._assignment.get(camera['id'])
+            if worker_id in self._workers:
+                self._workers[worker_id][1].put(('swap', camera['id'], camera['ip_address']))
+        # Viewers in this process have their own grabber
+        swap_grabber_source(camera['id'], camera['ip_address'])
+        # The worker restarts the camera itself when its grabber cannot switch over
+        return True
+
+    def _rebalance(self):
+        # Move only the cameras whose ring owner changed
+        for camera_id, camera in self._cameras.items():
+            target = self._ring.node_for(camera_id)
+            current = self._assignment.get(camera_id)
+            if target == current:
+                continue
+            if current in self._workers:
+                self._workers[current][1].put(('remove', camera_id))
+            if target is None:
+                self._assignment.pop(camera_id, None)
+                continue
+            self._workers[target][1].put(('add', camera))
+            self._assignment[camera_id] = target
+
+    def _relay_events(self):
+        last_reap = time.monotonic()
+        while True:
+            # Check worker liveness about once a second, even while alerts keep flowing
+            if time.monotonic() - last_reap >= 1:
+                self._reap_dead_workers()
+                last_reap = time.monotonic()
+
+            try:
+                message = self._events.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            if message[0] == 'emit':
+                _, event, data, room = message
+                self.socketio.emit(event, data, room=room)
+
+    def _reap_dead_workers(self):
+        with self._lock:
+            dead = [worker_id for worker_id, (process, _) in self._workers.items() if not process.is_alive()]
+        for worker_id in dead:
+            print(f"Camera worker {worker_id} exited, replacing it")
+            self.remove_worker(worker_id)
+            self.add_worker()
+
+    def stats(self):
+        with self._lock:
+            workers = {}
+            for worker_id, (process, _) in self._workers.items():
+                workers[str(worker_id)] = {
+                    'pid': process.pid,
+                    'alive': process.is_alive(),
+                    'cameras': sorted(camera_id for camera_id, assigned in self._assignment.items() if assigned == worker_id)
+                }
+            return workers
+
+def start_worker_pool(socketio, processes=CAMERA_WORKER_PROCESSES):
+    global _pool
+    _pool = WorkerPool(socketio)
+    # Workers first, so each camera is assigned once instead of moving as the ring grows
+    for _ in range(processes):
+        _pool.add_worker()
+    return _pool
+
+def get_worker_pool():
+    return _pool
+
+def get_worker_pool_stats():
+    return _pool.stats() if _pool else None
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import alert_aggregator as aggregator_module
+from services.alert_aggregator import AlertAggregator
+
+CAMERA = {'id': 1, 'name': 'Gate', 'user_id': 2}
+MODEL = {'id': 3, 'alert_cooldown_seconds': 30}
+
+class AlertAggregatorTest(unittest.TestCase):
+    def setUp(self):
+        self.aggregator = AlertAggregator(max_duration=600)
+        self.aggregator._ensure_started = lambda: None
+        self.socketio = mock.Mock()
+        patcher = mock.patch.object(aggregator_module, 'detection_writer')
+        self.writer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _hit(self, captured_at, open_event=None):
+        detection = {'detection_type': 'fire', 'confidence_score': 0.5, 'metadata': {}}
+        self.aggregator.record(CAMERA, MODEL, detection, captured_at, self.socketio, open_event or Future)
+
+    def _close_all(self):
+        events = list(self.aggregator._events.values())
+        self.aggregator._events.clear()
+        for event in events:
+            self.aggregator._close(event)
+
+    def test_single_hit_event_is_not_updated(self):
+        inserted = Future()
+        self._hit(100.0, lambda: inserted)
+        inserted.set_result(42)
+        self._close_all()
+
+        self.writer.submit_update.assert_not_called()
+        self.socketio.emit.assert_not_called()
+
+    def test_close_during_insert_waits_for_detection_id(self):
+        inserted = Future()
+
+        def open_event():
+            # Another hit and the sweeper run before open_event returns its future
+            self._hit(101.0)
+            self._close_all()
+            return inserted
+
+        self._hit(100.0, open_event)
+        self.writer.submit_update.assert_not_called()
+
+        inserted.set_result(42)
+        detection_id, fields = self.writer.submit_update.call_args[0]
+        self.assertEqual(detection_id, 42)
+        self.assertEqual(fields['hit_count'], 2)
+        self.assertEqual(self.socketio.emit.call_args[0][0], 'detection_update')
+
+if __name__ == '__main__':
+    unittest.main()
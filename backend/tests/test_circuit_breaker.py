@@ -0,0 +1,32 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import circuit_breaker
+from services.circuit_breaker import ModelGuard
+
+class ThrottleLoggingTest(unittest.TestCase):
+    def setUp(self):
+        self.guard = ModelGuard('detector')
+        self.guard.limit = 1.0
+        self.assertTrue(self.guard.try_acquire())
+
+    def test_throttled_calls_are_reported_once_per_interval(self):
+        with mock.patch('builtins.print') as log, mock.patch.object(circuit_breaker.time, 'monotonic') as clock:
+            clock.return_value = 100.0
+            for _ in range(5):
+                self.assertFalse(self.guard.try_acquire())
+            self.assertEqual(log.call_count, 1)
+
+            clock.return_value = 100.0 + circuit_breaker.THROTTLE_LOG_INTERVAL
+            self.assertFalse(self.guard.try_acquire())
+
+        self.assertEqual(log.call_count, 2)
+        self.assertIn('skipped 5 calls', log.call_args[0][0])
+        self.assertEqual(self.guard.stats()['throttled'], 6)
+
+if __name__ == '__main__':
+    unittest.main()
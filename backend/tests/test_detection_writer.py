@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import detection_writer as writer_module
+from services.detection_writer import DetectionWriter
+
+class FakeCursor:
+    def __init__(self, increment):
+        self.increment = increment
+        self.lastrowid = None
+        self.rowcount = 0
+        self._result = None
+
+    def execute(self, query, params=None):
+        if 'auto_increment_increment' in query:
+            self._result = (self.increment,)
+        elif query.startswith('INSERT INTO detections'):
+            self.lastrowid = 11
+            self.rowcount = len(params) // 7
+
+    def fetchone(self):
+        return self._result
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, increment=1):
+        self.increment = increment
+
+    def cursor(self):
+        return FakeCursor(self.increment)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def make_row():
+    return {'camera_id': 1, 'user_id': 2, 'model_id': 3, 'detection_type': 'fire', 'confidence_score': 0.9,
+            'timestamp': datetime(2026, 1, 1), 'metadata': {}}
+
+class DetectionWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.writer = DetectionWriter(batch_size=10, flush_interval=0.05, max_queue=100)
+        self.addCleanup(self.writer.stop)
+        patcher = mock.patch.object(writer_module, 'write_rollups')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ids_follow_auto_increment_increment(self):
+        with mock.patch.object(writer_module, 'get_db_connection', return_value=FakeConnection(increment=2)):
+            futures = [self.writer.submit(make_row()) for _ in range(3)]
+            ids = [future.result(timeout=5) for future in futures]
+        self.assertEqual(ids, [11, 13, 15])
+
+    def test_unexpected_error_fails_batch_and_keeps_writing(self):
+        with mock.patch.object(writer_module, 'get_db_connection', side_effect=[RuntimeError('boom'), FakeConnection()]), \
+                mock.patch('builtins.print'):
+            failed = self.writer.submit(make_row())
+            self.assertIsInstance(failed.exception(timeout=5), RuntimeError)
+
+            written = self.writer.submit(make_row())
+            self.assertEqual(written.result(timeout=5), 11)
+        self.assertTrue(self.writer._thread.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
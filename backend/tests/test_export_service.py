@@ -0,0 +1,114 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.export_service import EXPORT_COLUMNS, export_chunks, iter_chunks, parquet_available
+from services.stream_service import ClosingStream
+
+def make_rows(total):
+    return [
+        (index, datetime(2026, 1, 1, 0, index // 60 % 60, index % 60), None, 1, 'Gate', 2, 3, 'fire', 0.75, 1,
+         '{"detections": []}', None)
+        for index in range(1, total + 1)
+    ]
+
+class ListCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+class StreamConnection:
+    def __init__(self):
+        self.released = False
+        self.discarded = False
+
+    def close(self):
+        self.released = True
+
+    def discard(self):
+        self.discarded = True
+
+class ExportEncodingTest(unittest.TestCase):
+    def test_csv_has_header_and_rows(self):
+        body = b''.join(export_chunks(iter_chunks(ListCursor(make_rows(3)), 2), 'csv'))
+        lines = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(tuple(lines[0]), EXPORT_COLUMNS)
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[1][1], '2026-01-01T00:00:01')
+
+    def test_csv_without_rows_is_header_only(self):
+        body = b''.join(export_chunks(iter_chunks(ListCursor([])), 'csv'))
+        self.assertEqual(body.decode().strip(), ','.join(EXPORT_COLUMNS))
+
+    def test_gzip_ndjson_round_trip(self):
+        body = b''.join(export_chunks(iter_chunks(ListCursor(make_rows(5)), 2), 'ndjson', compress=True))
+        rows = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(rows[0]['metadata'], {'detections': []})
+
+    @unittest.skipUnless(parquet_available(), "pyarrow is not installed")
+    def test_parquet_streams_one_row_group_per_chunk(self):
+        import pyarrow.parquet as pq
+
+        parts = list(export_chunks(iter_chunks(ListCursor(make_rows(25)), 10), 'parquet'))
+        # Row groups are sent as they are written, not only when the file is complete
+        self.assertGreater(len(parts), 2)
+
+        parquet = pq.ParquetFile(io.BytesIO(b''.join(parts)))
+        self.assertEqual(parquet.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.num_rows, 25)
+        self.assertEqual(table.column('id').to_pylist()[-1], 25)
+        self.assertEqual(table.column('timestamp').to_pylist()[0], datetime(2026, 1, 1, 0, 0, 1))
+        self.assertEqual(json.loads(table.column('metadata')[0].as_py()), {'detections': []})
+
+    @unittest.skipUnless(parquet_available(), "pyarrow is not installed")
+    def test_parquet_without_rows_is_a_valid_file(self):
+        import pyarrow.parquet as pq
+
+        body = b''.join(export_chunks(iter_chunks(ListCursor([])), 'parquet', compress=True))
+        table = pq.read_table(io.BytesIO(gzip.decompress(body)))
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(tuple(table.schema.names), EXPORT_COLUMNS)
+
+class CancelledExportTest(unittest.TestCase):
+    def test_cancelled_export_stops_reading_and_discards_connection(self):
+        conn = StreamConnection()
+        cursor = ListCursor(make_rows(1000))
+        body = ClosingStream(conn, cursor, export_chunks(iter_chunks(cursor, 10), 'csv', compress=True))
+
+        next(body)
+        body.close()
+
+        self.assertTrue(conn.discarded)
+        self.assertFalse(conn.released)
+        self.assertLess(cursor.fetches, 5)
+
+    def test_completed_export_releases_connection(self):
+        conn = StreamConnection()
+        cursor = ListCursor(make_rows(25))
+        body = ClosingStream(conn, cursor, export_chunks(iter_chunks(cursor, 10), 'ndjson'))
+
+        self.assertEqual(b''.join(body).count(b'\n'), 25)
+        body.close()
+
+        self.assertTrue(conn.released)
+        self.assertFalse(conn.discarded)
+
+if __name__ == '__main__':
+    unittest.main()
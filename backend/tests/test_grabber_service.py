@@ -0,0 +1,32 @@
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@unittest.skipUnless(importlib.util.find_spec('cv2'), "opencv-python is not installed")
+class ReconnectBudgetTest(unittest.TestCase):
+    def test_exhausted_budget_reports_failed_and_keeps_retrying(self):
+        from services import grabber_service
+
+        grabber = grabber_service.FrameGrabber(1, 'rtsp://camera', 2)
+        states = []
+        grabber.add_listener(lambda camera_id, status: states.append(status['state']))
+
+        with mock.patch.object(grabber_service, 'RTSP_RECONNECT_MAX_ATTEMPTS', 3), \
+                mock.patch.object(grabber_service, 'RTSP_RECONNECT_MAX_DELAY', 60), mock.patch('builtins.print'):
+            grabber.attempts = 3
+            first = grabber.next_backoff()
+            grabber.attempts = 4
+            second = grabber.next_backoff()
+
+        for delay in (first, second):
+            self.assertGreaterEqual(delay, 30)
+            self.assertLessEqual(delay, 60)
+        self.assertEqual(states, ['failed', 'failed'])
+        self.assertFalse(grabber.stopped)
+
+if __name__ == '__main__':
+    unittest.main()
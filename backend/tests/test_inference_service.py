@@ -0,0 +1,125 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import Future, wait
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@unittest.skipUnless(importlib.util.find_spec('cv2'), "opencv-python is not installed")
+class BatchFallbackTest(unittest.TestCase):
+    def setUp(self):
+        from services import inference_service
+
+        self.service = inference_service
+        self.model = {'id': 901, 'name': 'fallback', 'batch_endpoint_url': 'http://models/batch',
+                      'batch_size': 4, 'batch_max_wait_ms': 10}
+        self.addCleanup(inference_service._batch_unsupported.pop, self.model['id'], None)
+
+    def _send(self, buffers, run_inference):
+        batch = [(buffer, Future()) for buffer in buffers]
+        with mock.patch.object(self.service, 'run_batch_inference', return_value=None), \
+                mock.patch.object(self.service, 'run_inference', side_effect=run_inference):
+            self.service.ModelBatcher._send(mock.Mock(model=self.model), batch)
+            done, _ = wait([future for _, future in batch], timeout=5)
+        self.assertEqual(len(done), len(batch))
+        return [future for _, future in batch]
+
+    def test_failed_frame_does_not_fail_the_batch(self):
+        def run_inference(model, buffer):
+            if buffer == b'bad':
+                raise ValueError('bad frame')
+            return {'frame': buffer.decode()}
+
+        futures = self._send([b'a', b'bad', b'c'], run_inference)
+
+        self.assertEqual(futures[0].result(), {'frame': 'a'})
+        self.assertIsInstance(futures[1].exception(), ValueError)
+        self.assertEqual(futures[2].result(), {'frame': 'c'})
+        self.assertIn(self.model['id'], self.service._batch_unsupported)
+
+    def test_unsupported_mark_expires_and_is_cleared_on_edit(self):
+        self._send([b'a'], lambda model, buffer: {})
+        self.assertFalse(self.service.batching_enabled(self.model))
+        # A different batch endpoint is tried straight away
+        self.assertTrue(self.service.batching_enabled(dict(self.model, batch_endpoint_url='http://models/v2/batch')))
+
+        with mock.patch.object(self.service.time, 'monotonic', return_value=time.monotonic() + self.service.BATCH_RETRY_INTERVAL):
+            self.assertTrue(self.service.batching_enabled(self.model))
+
+        self.service.forget_batch_support(self.model['id'])
+        self.assertTrue(self.service.batching_enabled(self.model))
+
+    def test_batcher_picks_up_edited_settings(self):
+        batcher = self.service.get_batcher(self.model)
+        self.addCleanup(self.service._batchers.pop, self.model['id'], None)
+
+        edited = dict(self.model, batch_size=16, batch_max_wait_ms=50)
+        self.assertIs(self.service.get_batcher(edited), batcher)
+        self.assertEqual(batcher.batch_size, 16)
+        self.assertEqual(batcher.max_wait, 0.05)
+
+    def test_fallback_requests_run_in_parallel(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def run_inference(model, buffer):
+            with lock:
+                running.append(buffer)
+                peak.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.remove(buffer)
+            return {}
+
+        self._send([b'a', b'b', b'c'], run_inference)
+        self.assertGreater(max(peak), 1)
+
+@unittest.skipUnless(importlib.util.find_spec('cv2'), "opencv-python is not installed")
+class ResponseValidationTest(unittest.TestCase):
+    def test_malformed_responses_are_dropped_before_handle_results(self):
+        from services import camera_service, inference_service
+
+        responses = [[{'confidence_score': 0.9}], 'ok', {'confidence_score': 'high'}, {'confidence_score': 0.9}]
+        futures = {}
+        for index, response in enumerate(responses):
+            future = Future()
+            future.set_result(response)
+            futures[future] = {'id': index, 'name': f"model-{index}"}
+        preparer = mock.Mock(to_frame_coordinates=lambda model, detection_data: detection_data)
+
+        with mock.patch.object(inference_service, 'result_cache', None), \
+                mock.patch.object(camera_service, 'alert_aggregator') as aggregator, mock.patch('builtins.print'):
+            results = inference_service.collect_results([], futures, None, preparer, camera_id=1)
+            camera_service.handle_results({'id': 1}, results, mock.Mock(), 100.0)
+
+        self.assertEqual([model['id'] for model, _ in results], [3])
+        self.assertEqual(aggregator.record.call_count, 1)
+
+@unittest.skipUnless(importlib.util.find_spec('cv2'), "opencv-python is not installed")
+class SubmitFrameTest(unittest.TestCase):
+    def test_encoding_error_skips_only_that_model(self):
+        from services import inference_service
+
+        models = [{'id': 911, 'name': 'broken', 'jpeg_quality': 'high'}, {'id': 912, 'name': 'working'}]
+
+        def get(model):
+            if model['name'] == 'broken':
+                raise ValueError('invalid literal for int()')
+            return b'jpeg'
+
+        preparer = mock.Mock(get=get)
+        with mock.patch.object(inference_service, 'result_cache', None), \
+                mock.patch.object(inference_service, 'run_inference', return_value={}), mock.patch('builtins.print'):
+            _, futures, _ = inference_service.submit_frame(models, preparer, camera_id=1)
+            wait(futures, timeout=5)
+
+        self.assertEqual([model['name'] for model in futures.values()], ['working'])
+        self.assertEqual(inference_service.get_guard(models[0]).stats()['in_flight'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@unittest.skipUnless(importlib.util.find_spec('cv2'), "opencv-python is not installed")
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        from services.result_cache import ResultCache
+
+        self.cache = ResultCache(ttl=60, max_entries=8, max_distance=2)
+
+    def test_cameras_do_not_share_responses(self):
+        self.cache.put(1, 5, 0b1010, {'detections': ['fire']})
+
+        self.assertEqual(self.cache.get(1, 5, 0b1010), {'detections': ['fire']})
+        # Same model and an identical hash, but the frame came from another camera
+        self.assertIsNone(self.cache.get(2, 5, 0b1010))
+
+    def test_near_identical_frame_hits_within_distance(self):
+        self.cache.put(1, 5, 0b1010, {'detections': []})
+
+        self.assertEqual(self.cache.get(1, 5, 0b1011), {'detections': []})
+        self.assertIsNone(self.cache.get(1, 5, 0b0101))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['by_camera']['1'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+from itertools import count
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from services.db_service import ConnectionPool
+from services.stream_service import stream_query
+
+class FakeCursor:
+    """Unbuffered cursor over an endless result; counts how many chunks were fetched."""
+
+    def __init__(self):
+        self.fetches = 0
+        self.ids = count(1)
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        return [{'id': next(self.ids)} for _ in range(size)]
+
+    def close(self):
+        pass
+
+class FiniteCursor(FakeCursor):
+    def fetchmany(self, size):
+        self.fetches += 1
+        return [{'id': 1}, {'id': 2}, {'id': 3}] if self.fetches == 1 else []
+
+class FakeConnection:
+    def __init__(self, connection_id=7):
+        self.connection_id = connection_id
+        self.rolled_back = False
+        self.closed = False
+        self.queries = []
+        self.last_cursor = None
+
+    def cursor(self, **kwargs):
+        self.last_cursor = FakeCursor()
+        return self.last_cursor
+
+    def rollback(self):
+        # mysql-connector reads every unread row here, which is what an abandoned stream must avoid
+        self.rolled_back = True
+
+    def cmd_query(self, query):
+        self.queries.append(query)
+
+    def close(self):
+        self.closed = True
+
+class AbandonedStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.pool = ConnectionPool({}, size=1, timeout=1, ping_after=5)
+        self.raw = FakeConnection()
+        self.killer = FakeConnection(connection_id=8)
+        patcher = mock.patch('services.db_service.mysql.connector.connect', side_effect=[self.raw, self.killer])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _stream(self):
+        with self.app.test_request_context():
+            return stream_query(self.pool.get_connection(), "SELECT * FROM detections", [], 'ndjson')
+
+    def test_abandoned_stream_kills_connection_without_draining(self):
+        response = self._stream()
+        body = iter(response.response)
+        next(body)
+        next(body)
+        response.close()
+
+        self.assertFalse(self.raw.rolled_back)
+        self.assertTrue(self.raw.closed)
+        self.assertEqual(self.killer.queries, ["KILL 7"])
+        self.assertEqual(self.raw.last_cursor.fetches, 2)
+        stats = self.pool.stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['connections_aborted'], 1)
+
+    def test_stream_closed_before_first_chunk_is_released(self):
+        response = self._stream()
+        response.close()
+
+        self.assertFalse(self.raw.rolled_back)
+        self.assertEqual(self.killer.queries, ["KILL 7"])
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+
+    def test_finished_stream_returns_connection_to_pool(self):
+        self.raw.cursor = lambda **kwargs: FiniteCursor()
+        response = self._stream()
+        body = b''.join(chunk.encode() if isinstance(chunk, str) else chunk for chunk in response.response)
+        response.close()
+
+        self.assertEqual(body.count(b'\n'), 3)
+        self.assertTrue(self.raw.rolled_back)
+        self.assertFalse(self.raw.closed)
+        self.assertEqual(self.killer.queries, [])
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
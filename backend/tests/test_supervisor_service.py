@@ -0,0 +1,42 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@unittest.skipUnless(importlib.util.find_spec('cv2'), "opencv-python is not installed")
+class SupervisorRestartTest(unittest.TestCase):
+    def test_restarted_camera_waits_for_the_old_task(self):
+        from services.supervisor_service import CameraSupervisor
+
+        running = []
+        overlaps = []
+
+        async def run_camera(camera_id, rtsp_url, stop_event):
+            overlaps.append(len(running))
+            running.append(rtsp_url)
+            await stop_event.wait()
+            # Releasing the grabber takes a moment after the stop signal
+            await asyncio.sleep(0.05)
+            running.remove(rtsp_url)
+
+        supervisor = CameraSupervisor(mock.Mock(), worker_budget=1, decode_workers=1)
+        supervisor._run_camera = run_camera
+        supervisor.start()
+        self.addCleanup(supervisor.loop.call_soon_threadsafe, supervisor.loop.stop)
+
+        supervisor.add_camera({'id': 1, 'name': 'Gate', 'ip_address': 'old'}).result(timeout=5)
+        removed = supervisor.remove_camera(1)
+        added = supervisor.add_camera({'id': 1, 'name': 'Gate', 'ip_address': 'new'})
+        removed.result(timeout=5)
+        added.result(timeout=5)
+
+        self.assertEqual(overlaps, [0, 0])
+        self.assertEqual(running, ['new'])
+        supervisor.remove_camera(1).result(timeout=5)
+
+if __name__ == '__main__':
+    unittest.main()
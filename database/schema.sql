@@ -1,7 +1,11 @@
 
 -- Drop tables if they exist
 DROP TABLE IF EXISTS audit_logs;
+DROP TABLE IF EXISTS detection_rollup_minute;
+DROP TABLE IF EXISTS detection_rollup_hour;
+DROP TABLE IF EXISTS detection_rollup_day;
 DROP TABLE IF EXISTS detections;
+DROP TABLE IF EXISTS camera_model_schedules;
 DROP TABLE IF EXISTS models;
 DROP TABLE IF EXISTS cameras;
 DROP TABLE IF EXISTS users;
@@ -24,6 +28,9 @@ CREATE TABLE cameras (
     location VARCHAR(100) NOT NULL,
     ip_address VARCHAR(100) NOT NULL,
     status ENUM('active', 'inactive') NOT NULL DEFAULT 'inactive',
+    motion_sensitivity FLOAT NULL,
+    -- Region of interest sent to the models, as fractions of the frame: {"x", "y", "width", "height"}
+    roi JSON NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -35,26 +42,105 @@ CREATE TABLE models (
     endpoint_url VARCHAR(255) NOT NULL,
     api_key VARCHAR(255) NOT NULL,
     description TEXT,
+    input_width INT NULL,
+    input_height INT NULL,
+    jpeg_quality TINYINT NULL,
+    color_space ENUM('bgr', 'rgb', 'gray') NOT NULL DEFAULT 'bgr',
+    timeout_seconds FLOAT NULL,
+    pool_size INT NULL,
+    batch_endpoint_url VARCHAR(255) NULL,
+    batch_size INT NULL,
+    batch_max_wait_ms INT NULL,
+    alert_cooldown_seconds FLOAT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create detections table
-CREATE TABLE detections (
+-- Create camera model schedules table (cameras without rows run every model at CAMERA_INTERVAL)
+CREATE TABLE camera_model_schedules (
     id INT AUTO_INCREMENT PRIMARY KEY,
     camera_id INT NOT NULL,
+    model_id INT NOT NULL,
+    interval_seconds FLOAT NOT NULL,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (camera_id) REFERENCES cameras(id) ON DELETE CASCADE,
+    FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_camera_model (camera_id, model_id)
+);
+
+-- Create detections table, range-partitioned by timestamp. Partitioned tables cannot have foreign keys
+-- and every unique key must include the timestamp; setup_database splits pmax into day/month partitions
+-- and the retention job keeps them ahead of time, archiving and dropping the old ones
+CREATE TABLE detections (
+    id INT AUTO_INCREMENT,
+    camera_id INT NOT NULL,
     user_id INT NOT NULL,
     model_id INT NOT NULL,
     detection_type VARCHAR(50) NOT NULL,
     confidence_score FLOAT NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     metadata JSON,
+    -- Aggregated events: timestamp is the first hit, ended_at the last; confidence_score is the peak
+    ended_at TIMESTAMP NULL,
+    hit_count INT NOT NULL DEFAULT 1,
     video_clip_path VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (camera_id) REFERENCES cameras(id) ON DELETE CASCADE,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (model_id) REFERENCES models(id) ON DELETE CASCADE,
-    INDEX (camera_id),
-    INDEX (user_id)
+    PRIMARY KEY (id, timestamp),
+    -- Keyset pagination on (timestamp, id), optionally narrowed by owner, camera, model or type
+    INDEX idx_detections_time (timestamp, id),
+    INDEX idx_detections_user_time (user_id, timestamp, id),
+    INDEX idx_detections_camera_time (camera_id, timestamp, id),
+    INDEX idx_detections_model_time (model_id, timestamp, id),
+    INDEX idx_detections_type_time (detection_type, timestamp, id)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Create detection rollup tables (per minute, hour and day; upserted by the detection writer)
+CREATE TABLE detection_rollup_minute (
+    bucket_start DATETIME NOT NULL,
+    user_id INT NOT NULL,
+    camera_id INT NOT NULL,
+    model_id INT NOT NULL,
+    detection_type VARCHAR(50) NOT NULL,
+    detection_count INT NOT NULL DEFAULT 0,
+    hit_count INT NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE NOT NULL DEFAULT 0,
+    confidence_max FLOAT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, user_id, camera_id, model_id, detection_type),
+    INDEX idx_detection_rollup_minute_user (user_id, bucket_start),
+    INDEX idx_detection_rollup_minute_camera (camera_id, bucket_start)
+);
+
+CREATE TABLE detection_rollup_hour (
+    bucket_start DATETIME NOT NULL,
+    user_id INT NOT NULL,
+    camera_id INT NOT NULL,
+    model_id INT NOT NULL,
+    detection_type VARCHAR(50) NOT NULL,
+    detection_count INT NOT NULL DEFAULT 0,
+    hit_count INT NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE NOT NULL DEFAULT 0,
+    confidence_max FLOAT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, user_id, camera_id, model_id, detection_type),
+    INDEX idx_detection_rollup_hour_user (user_id, bucket_start),
+    INDEX idx_detection_rollup_hour_camera (camera_id, bucket_start)
+);
+
+CREATE TABLE detection_rollup_day (
+    bucket_start DATETIME NOT NULL,
+    user_id INT NOT NULL,
+    camera_id INT NOT NULL,
+    model_id INT NOT NULL,
+    detection_type VARCHAR(50) NOT NULL,
+    detection_count INT NOT NULL DEFAULT 0,
+    hit_count INT NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE NOT NULL DEFAULT 0,
+    confidence_max FLOAT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, user_id, camera_id, model_id, detection_type),
+    INDEX idx_detection_rollup_day_user (user_id, bucket_start),
+    INDEX idx_detection_rollup_day_camera (camera_id, bucket_start)
 );
 
 -- Create audit logs table
@@ -6,6 +6,9 @@ import { toast } from "@/components/ui/sonner";
 import { WEBSOCKET_URL } from '@/config';
 import { Detection } from '@/api/mockApi';
 
+// Bigger alert batches are summarised in a single toast
+const MAX_ALERT_TOASTS = 3;
+
 export function useWebSocket() {
   const { user } = useAuth();
   const [socket, setSocket] = useState<Socket | null>(null);
@@ -18,15 +21,18 @@ export function useWebSocket() {
       return;
     }
 
-    // Create socket connection
-    const newSocket = io(WEBSOCKET_URL);
+    // Create socket connection; the server checks the JWT once and joins us to our alert rooms
+    const newSocket = io(WEBSOCKET_URL, {
+      auth: { token: localStorage.getItem('token') }
+    });
 
     newSocket.on('connect', () => {
       console.log('WebSocket connected');
       setIsConnected(true);
-      
-      // Subscribe to user-specific notifications
-      newSocket.emit('subscribe', { user_id: user.id });
+    });
+
+    newSocket.on('connect_error', (error) => {
+      console.error('WebSocket connection refused:', error.message);
     });
 
     newSocket.on('disconnect', () => {
@@ -34,12 +40,7 @@ export function useWebSocket() {
       setIsConnected(false);
     });
 
-    // Listen for detection alerts
-    newSocket.on('detection_alert', (data: Detection) => {
-      console.log('Detection alert received:', data);
-      setLatestDetection(data);
-      
-      // Show a toast notification
+    const showAlert = (data: Detection) => {
       const alertType = data.type;
       const severity = alertType === 'weapon' || alertType === 'fire' ? 'error' : 'warning';
       
@@ -47,6 +48,32 @@ export function useWebSocket() {
         description: `Confidence: ${Math.round(data.confidence * 100)}%`,
         duration: 6000
       });
+    };
+
+    // Listen for detection alerts
+    newSocket.on('detection_alert', (data: Detection) => {
+      console.log('Detection alert received:', data);
+      setLatestDetection(data);
+      showAlert(data);
+    });
+
+    // Alerts batched by the server: one message per tick
+    newSocket.on('detection_alerts', (batch: Detection[]) => {
+      console.log(`${batch.length} detection alerts received`);
+      if (batch.length === 0) {
+        return;
+      }
+      setLatestDetection(batch[batch.length - 1]);
+      
+      if (batch.length <= MAX_ALERT_TOASTS) {
+        batch.forEach(showAlert);
+      } else {
+        const hasCritical = batch.some(data => data.type === 'weapon' || data.type === 'fire');
+        toast[hasCritical ? 'error' : 'warning'](`${batch.length} detections`, {
+          description: `Cameras: ${Array.from(new Set(batch.map(data => data.camera_name))).join(', ')}`,
+          duration: 6000
+        });
+      }
     });
 
     setSocket(newSocket);